@@ -11,10 +11,23 @@ from typing import Optional
 os.environ["HF_HUB_OFFLINE"] = "1"
 os.environ["TRANSFORMERS_OFFLINE"] = "1"
 
+import anyio
+import faiss
+import torch
 from fastapi import FastAPI, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 
-from main import initialize_system, handle_query
+from main import (
+    COMPUTE_THREADS,
+    initialize_system,
+    handle_query,
+    prefetch_retrieval,
+    split_questions,
+    retrieve_chunks_with_threshold,
+)
 from src.query_parser import QueryParser
 
 # Configure logging
@@ -24,6 +37,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Max concurrent /query requests executing in the worker threadpool
+API_THREAD_LIMIT = int(os.getenv("API_THREAD_LIMIT", "16"))
+
+# Run one embedding, FAISS search and LLM call at startup (set to 0 to skip)
+API_WARMUP = os.getenv("API_WARMUP", "1") == "1"
+
 # =============================================================
 # FASTAPI APP INITIALIZATION
 # =============================================================
@@ -31,9 +50,13 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="JA Assure RAG API",
     description="Production-grade insurance proposal intelligence system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Compress long answers; small health/status responses are sent as-is
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Global state - initialized once at startup
 embedder = None
 llm = None
@@ -49,17 +72,47 @@ async def startup_event():
     global embedder, llm, qa_store, analytical_engine, metadata, query_parser
     
     logger.info("Starting JA Assure RAG API...")
+    
+    # Size the threadpool that runs blocking handle_query calls
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREAD_LIMIT
+    
+    # Cap compute threads before any model or index is loaded
+    torch.set_num_threads(COMPUTE_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable before torch starts parallel work
+    faiss.omp_set_num_threads(1)
+    logger.info(f"Compute threads per request: {COMPUTE_THREADS} (FAISS: 1, batched)")
     logger.info("Initializing system components...")
     
     # Initialize all components
     embedder, llm, qa_store, analytical_engine, metadata = initialize_system()
     
-    # Create a persistent query parser for conversation history
-    query_parser = QueryParser(llm)
+    # Create a persistent query parser for conversation history; known
+    # entity names come from the metadata already in memory
+    query_parser = QueryParser(llm, metadata=metadata)
+    
+    if API_WARMUP:
+        await run_in_threadpool(_warmup)
     
     logger.info("API startup complete. Ready to handle requests.")
 
 
+def _warmup() -> None:
+    """Pay first-call costs (kernel init, index page-in, LLM TLS handshake) before serving."""
+    logger.info("Warming up embedder, FAISS index and LLM client...")
+    try:
+        retrieve_chunks_with_threshold("warmup", embedder)
+    except Exception as e:
+        logger.warning(f"Retrieval warmup failed: {e}")
+    
+    try:
+        llm.generate("Reply with OK.")
+    except Exception as e:
+        logger.warning(f"LLM warmup failed: {e}")
+
+
 # =============================================================
 # REQUEST/RESPONSE MODELS
 # =============================================================
@@ -99,6 +152,36 @@ async def health_check():
     return {"status": "ok"}
 
 
+def _answer_question(question: str) -> str:
+    """Answer a (possibly multi-part) question synchronously."""
+    questions = split_questions(question)
+    if len(questions) > 1:
+        # One embedding call and one FAISS search for all sub-questions
+        query_vectors = prefetch_retrieval(questions, embedder)
+        answers = []
+        for i, (sub_q, sub_vector) in enumerate(zip(questions, query_vectors), 1):
+            sub_answer = handle_query(
+                query=sub_q,
+                embedder=embedder,
+                llm=llm,
+                qa_store=qa_store,
+                analytical_engine=analytical_engine,
+                query_parser=query_parser,
+                query_vector=sub_vector
+            )
+            answers.append(f"Q{i}: {sub_q}\n{sub_answer}")
+        return "\n\n".join(answers)
+    
+    return handle_query(
+        query=question,
+        embedder=embedder,
+        llm=llm,
+        qa_store=qa_store,
+        analytical_engine=analytical_engine,
+        query_parser=query_parser
+    )
+
+
 @app.post("/query", response_model=QueryResponse, tags=["Query"])
 async def query_endpoint(request: QueryRequest):
     """
@@ -139,31 +222,8 @@ async def query_endpoint(request: QueryRequest):
     logger.info(f"Received query: {question}")
     
     try:
-        # Multi-question support
-        from main import split_questions
-        questions = split_questions(question)
-        if len(questions) > 1:
-            answers = []
-            for i, sub_q in enumerate(questions, 1):
-                sub_answer = handle_query(
-                    query=sub_q,
-                    embedder=embedder,
-                    llm=llm,
-                    qa_store=qa_store,
-                    analytical_engine=analytical_engine,
-                    query_parser=query_parser
-                )
-                answers.append(f"Q{i}: {sub_q}\n{sub_answer}")
-            answer = "\n\n".join(answers)
-        else:
-            answer = handle_query(
-                query=question,
-                embedder=embedder,
-                llm=llm,
-                qa_store=qa_store,
-                analytical_engine=analytical_engine,
-                query_parser=query_parser
-            )
+        # handle_query is blocking (embedding, FAISS, LLM) - run it off the event loop
+        answer = await run_in_threadpool(_answer_question, question)
         
         logger.info(f"Generated answer (length: {len(answer)} chars)")
         
@@ -185,6 +245,7 @@ async def query_endpoint(request: QueryRequest):
 # =============================================================
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     
     print("\n=== JA Assure RAG API ===")
@@ -199,5 +260,9 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=False,
-        log_level="info"
+        log_level="info",
+        # uvloop + httptools come with uvicorn[standard]; uvloop has no Windows build
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        access_log=False
     )
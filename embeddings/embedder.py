@@ -5,20 +5,64 @@ This module implements Pattern 3: Batch Embedding with Retry and Exponential Bac
 """
 from __future__ import annotations
 
+import functools
+import math
+import os
 import time
 import logging
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
 # Configuration constants
 DEFAULT_MODEL = "all-MiniLM-L6-v2"
-DEFAULT_BATCH_SIZE = 16
+DEFAULT_BATCH_SIZE = 64
 MAX_RETRIES = 3
 BASE_DELAY_SECONDS = 2
+QUERY_CACHE_SIZE = 1024
+
+# Inference backend: "torch" (default) or "onnx" (ONNX Runtime, needs
+# optimum[onnxruntime]). The ONNX file defaults to the int8 dynamically
+# quantized export shipped with the model repo.
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch")
+EMBEDDER_ONNX_FILE = os.getenv("EMBEDDER_ONNX_FILE", "onnx/model_qint8_avx2.onnx")
+
+# EMBEDDER_CPU_INT8=1 applies int8 dynamic quantization to the Linear layers
+# of the torch model when it runs on CPU. Embeddings shift slightly, so
+# rebuild the index after changing it.
+EMBEDDER_CPU_INT8 = os.getenv("EMBEDDER_CPU_INT8", "0") == "1"
+
+# Corpora at least this large are encoded by a multi-process pool
+MULTI_PROCESS_MIN_TEXTS = int(os.getenv("EMBED_MULTI_PROCESS_MIN_TEXTS", "2048"))
+# CPU pool size cap; the cores are split evenly between the workers' torch threads
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+
+# FP16 Tensor Cores want sequence lengths that are multiples of 8
+PAD_TO_MULTIPLE_OF = 8
 
 logger = logging.getLogger(__name__)
 
 
+class _PadToMultipleTokenizer:
+    """Tokenizer proxy that pads every batch to a multiple of N tokens."""
+
+    def __init__(self, tokenizer, multiple: int):
+        self._tokenizer = tokenizer
+        self._multiple = multiple
+
+    def __call__(self, *args, **kwargs):
+        kwargs.setdefault("pad_to_multiple_of", self._multiple)
+        return self._tokenizer(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Only reached for attributes the proxy lacks. While unpickling,
+        # __init__ has not run, so _tokenizer itself lands here; refuse it
+        # (and dunder lookups such as __setstate__) instead of recursing
+        if name == "_tokenizer" or (name.startswith("__") and name.endswith("__")):
+            raise AttributeError(name)
+        return getattr(self._tokenizer, name)
+
+
 class Embedder:
     """
     Sentence Transformer wrapper with batch processing and retry logic.
@@ -32,14 +76,74 @@ class Embedder:
             model_name: HuggingFace model name for embeddings.
         """
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.model, self.backend = self._load_model(model_name)
+        if self.model.device.type == "cuda":
+            self.model.tokenizer = _PadToMultipleTokenizer(
+                self.model.tokenizer, PAD_TO_MULTIPLE_OF
+            )
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
 
+        # Uncased models embed "Foo  Bar" and "foo bar" identically, so
+        # those variants share one cache entry
+        self._lowercase_keys = bool(getattr(self.model.tokenizer, "do_lower_case", False))
+        self._embed_single_cached = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(
+            self._embed_single_uncached
+        )
+
+    @staticmethod
+    def _load_model(model_name: str) -> tuple[SentenceTransformer, str]:
+        """
+        Load the model on the configured backend, falling back to torch.
+
+        The torch backend is placed on CUDA in FP16 when a GPU is available,
+        and optionally int8-quantized on CPU (EMBEDDER_CPU_INT8).
+
+        Returns:
+            The model, and a description of the backend it actually runs on
+            (e.g. "onnx:onnx/model_qint8_avx2.onnx", "torch:cuda:fp16").
+        """
+        if EMBEDDER_BACKEND == "onnx":
+            try:
+                model = SentenceTransformer(
+                    model_name,
+                    backend="onnx",
+                    model_kwargs={"file_name": EMBEDDER_ONNX_FILE}
+                )
+                logger.info(f"Loaded {model_name} on ONNX Runtime ({EMBEDDER_ONNX_FILE})")
+                return model, f"onnx:{EMBEDDER_ONNX_FILE}"
+            except Exception as e:
+                logger.warning(f"ONNX backend unavailable ({e}); using torch")
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = SentenceTransformer(model_name, device=device)
+        backend = f"torch:{device}:fp32"
+        if device == "cuda":
+            model.half()
+            backend = "torch:cuda:fp16"
+        elif EMBEDDER_CPU_INT8:
+            torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+            device = "cpu (int8 dynamic quantization)"
+            backend = "torch:cpu:int8"
+        logger.info(f"Loaded {model_name} on {device}")
+        return model, backend
+
+    @property
+    def cache_namespace(self) -> str:
+        """
+        Identifies the vectors this embedder produces: the model plus the
+        backend, ONNX file, quantization and precision it runs with. Used to
+        key persistent embedding caches, so changing any of them re-embeds.
+        """
+        return f"{self.model_name}|{self.backend}"
+
     def embed_texts(
         self,
         texts: list[str],
         show_progress: bool = True,
-        normalize: bool = True
+        normalize: bool = True,
+        batch_size: int = DEFAULT_BATCH_SIZE
     ) -> np.ndarray:
         """
         Embed a list of texts using the sentence transformer.
@@ -48,35 +152,53 @@ class Embedder:
             texts: List of text strings to embed.
             show_progress: Whether to show a progress bar.
             normalize: Whether to normalize embeddings for cosine similarity.
+            batch_size: Texts per forward pass.
 
         Returns:
-            Numpy array of shape (n_texts, embedding_dim).
+            C-contiguous float32 array of shape (n_texts, embedding_dim)
+            (an FP16 model's output is upcast here, once).
         """
         if not texts:
             return np.array([])
 
-        return self.model.encode(
+        embeddings = self.model.encode(
             texts,
+            batch_size=batch_size,
             show_progress_bar=show_progress,
             normalize_embeddings=normalize
         )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
 
     def embed_single(self, text: str, normalize: bool = True) -> np.ndarray:
         """
         Embed a single text string.
 
+        Results are kept in an in-memory LRU cache keyed by the
+        whitespace-normalized text, so repeated queries skip the model.
+
         Args:
             text: Text string to embed.
             normalize: Whether to normalize the embedding.
 
         Returns:
-            Numpy array of shape (embedding_dim,).
+            Read-only, C-contiguous float32 array of shape (embedding_dim,).
         """
-        return self.model.encode(
+        key = " ".join(text.split())
+        if self._lowercase_keys:
+            key = key.lower()
+        return self._embed_single_cached(key, normalize)
+
+    def _embed_single_uncached(self, text: str, normalize: bool) -> np.ndarray:
+        """Embed one text with the model (backs the embed_single cache)."""
+        vector = self.model.encode(
             [text],
             show_progress_bar=False,
             normalize_embeddings=normalize
         )[0]
+        # float32, C-contiguous: FAISS and BLAS take it without a copy
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        vector.setflags(write=False)  # Shared between cache hits
+        return vector
 
     def embed_with_retry(
         self,
@@ -93,6 +215,9 @@ class Embedder:
         - Log each retry attempt
         - Skip failed batches rather than crashing
 
+        Texts are batched in order of length so each batch pads to a
+        similar sequence length; rows are returned in input order.
+
         Args:
             texts: List of text strings to embed.
             batch_size: Number of texts per batch.
@@ -104,13 +229,19 @@ class Embedder:
         if not texts:
             return np.array([])
 
-        all_embeddings = []
+        # Rows are written in place at their input position
+        result = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        embedded = np.zeros(len(texts), dtype=np.bool_)
         total_batches = (len(texts) + batch_size - 1) // batch_size
 
         logger.info(f"Starting batch embedding: {len(texts)} texts in {total_batches} batches")
 
+        # Character length is a cheap proxy for token length
+        order = np.argsort([len(t) for t in texts], kind="stable")
+
         for batch_idx in range(0, len(texts), batch_size):
-            batch = texts[batch_idx:batch_idx + batch_size]
+            positions = order[batch_idx:batch_idx + batch_size]
+            batch = [texts[i] for i in positions]
             batch_num = batch_idx // batch_size + 1
 
             batch_embeddings = self._embed_batch_with_retry(
@@ -118,17 +249,84 @@ class Embedder:
             )
 
             if batch_embeddings is not None:
-                all_embeddings.append(batch_embeddings)
+                result[positions] = batch_embeddings
+                embedded[positions] = True
 
-        if not all_embeddings:
+        if not embedded.any():
             logger.error("All batches failed. No embeddings generated.")
             return np.array([])
 
-        result = np.vstack(all_embeddings)
+        # Rows of skipped batches are dropped
+        if not embedded.all():
+            result = result[embedded]
         logger.info(f"Batch embedding complete: {len(result)} embeddings generated")
 
         return result
 
+    def embed_corpus(
+        self,
+        texts: list[str],
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> np.ndarray:
+        """
+        Embed a whole corpus, spreading large corpora over worker processes.
+
+        Small corpora (below MULTI_PROCESS_MIN_TEXTS) go through
+        embed_with_retry, since pool start-up would dominate, and so does
+        any corpus when there is only one device to spread it over. Larger
+        ones are encoded by one process per GPU (cuda:N), or on CPU by up
+        to EMBED_MAX_WORKERS processes that share the cores between their
+        torch threads instead of each starting one thread per core.
+
+        Args:
+            texts: List of text strings to embed.
+            batch_size: Number of texts per batch.
+
+        Returns:
+            Numpy array of shape (n_texts, embedding_dim).
+        """
+        if len(texts) < MULTI_PROCESS_MIN_TEXTS:
+            return self.embed_with_retry(texts, batch_size=batch_size)
+
+        if torch.cuda.is_available():
+            devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+            threads_per_worker = None
+        else:
+            cpus = os.cpu_count() or 1
+            devices = ["cpu"] * max(1, min(EMBED_MAX_WORKERS, cpus))
+            threads_per_worker = max(1, cpus // len(devices))
+
+        if len(devices) < 2:
+            return self.embed_with_retry(texts, batch_size=batch_size)
+
+        logger.info(f"Starting multi-process embedding: {len(texts)} texts on {len(devices)} workers")
+
+        try:
+            # Workers are spawned and import torch afresh, so the thread
+            # count is passed through the environment they inherit
+            previous_threads = os.environ.get("OMP_NUM_THREADS")
+            if threads_per_worker is not None:
+                os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+            try:
+                pool = self.model.start_multi_process_pool(devices)
+            finally:
+                if previous_threads is None:
+                    os.environ.pop("OMP_NUM_THREADS", None)
+                else:
+                    os.environ["OMP_NUM_THREADS"] = previous_threads
+            try:
+                return self.model.encode(
+                    texts,
+                    pool=pool,
+                    batch_size=batch_size,
+                    normalize_embeddings=True
+                )
+            finally:
+                self.model.stop_multi_process_pool(pool)
+        except Exception as e:
+            logger.warning(f"Multi-process embedding failed ({e}); falling back to batches")
+            return self.embed_with_retry(texts, batch_size=batch_size)
+
     def _embed_batch_with_retry(
         self,
         batch: list[str],
@@ -152,6 +350,7 @@ class Embedder:
             try:
                 embeddings = self.model.encode(
                     batch,
+                    batch_size=len(batch),
                     show_progress_bar=False,
                     normalize_embeddings=True
                 )
@@ -181,52 +380,73 @@ class Embedder:
         return self.embedding_dim
 
 
-def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
+def cosine_similarity(
+    vec1: np.ndarray,
+    vec2: np.ndarray,
+    assume_normalized: bool = True
+) -> float:
     """
     Compute cosine similarity between two vectors.
 
     For normalized vectors (as produced by this embedder), this is
-    equivalent to the dot product.
+    equivalent to the dot product, so the norms are skipped by default.
 
     Args:
         vec1: First vector.
         vec2: Second vector.
+        assume_normalized: Treat both vectors as L2-normalized.
 
     Returns:
         Cosine similarity score between -1 and 1.
     """
-    vec1 = np.asarray(vec1).flatten()
-    vec2 = np.asarray(vec2).flatten()
+    vec1 = np.asarray(vec1, dtype=np.float32).ravel()
+    vec2 = np.asarray(vec2, dtype=np.float32).ravel()
 
     dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
+    if assume_normalized:
+        return float(dot_product)
 
-    if norm1 == 0 or norm2 == 0:
+    # Squared norms as two more BLAS dot products (cheaper than linalg.norm
+    # for a single short vector)
+    norm_sq = float(np.dot(vec1, vec1)) * float(np.dot(vec2, vec2))
+    if norm_sq == 0:
         return 0.0
 
-    return float(dot_product / (norm1 * norm2))
+    return float(dot_product) / math.sqrt(norm_sq)
 
 
-def batch_cosine_similarity(query_vec: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+def batch_cosine_similarity(
+    query_vec: np.ndarray,
+    vectors: np.ndarray,
+    assume_normalized: bool = True
+) -> np.ndarray:
     """
     Compute cosine similarity between a query vector and multiple vectors.
 
+    Inputs are made C-contiguous float32 so the product runs as a single
+    BLAS SGEMV.
+
     Args:
         query_vec: Query vector of shape (dim,).
         vectors: Matrix of vectors of shape (n, dim).
+        assume_normalized: Treat the query and all vectors as L2-normalized.
 
     Returns:
         Array of similarity scores of shape (n,).
     """
-    query_vec = np.asarray(query_vec).flatten()
-    vectors = np.asarray(vectors)
+    query_vec = np.ascontiguousarray(query_vec, dtype=np.float32).ravel()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
 
     if vectors.ndim == 1:
         vectors = vectors.reshape(1, -1)
 
     # For normalized vectors, cosine similarity = dot product
-    similarities = np.dot(vectors, query_vec)
-
-    return similarities
-
+    similarities = vectors @ query_vec
+    if assume_normalized:
+        return similarities
+
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vec)
+    return np.divide(
+        similarities, norms,
+        out=np.zeros_like(similarities), where=norms != 0
+    )
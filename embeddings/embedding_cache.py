@@ -0,0 +1,119 @@
+"""
+Persistent embedding cache keyed by content hash.
+
+Vectors are stored in a small SQLite table keyed by
+"<namespace>:<sha256 of text>", so re-indexing only embeds chunks whose
+text changed. The namespace (Embedder.cache_namespace) covers the model,
+backend, ONNX file, quantization and precision, so changing any of them
+never returns stale vectors.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+from typing import Callable
+
+import numpy as np
+
+# Configuration constants
+DEFAULT_CACHE_PATH = "index/embed_cache.sqlite"
+SQLITE_MAX_VARIABLES = 900  # Stay below SQLite's bound-parameter limit
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed text -> float32 vector cache.
+    """
+
+    def __init__(self, namespace: str, path: str = DEFAULT_CACHE_PATH):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            namespace: Identifies the embedding setup the vectors come from
+                (see Embedder.cache_namespace); prefixed to every key.
+            path: SQLite database file.
+        """
+        self.namespace = namespace
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+    def key(self, text: str) -> str:
+        """Cache key for a text under this cache's namespace."""
+        return f"{self.namespace}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Return the cached vectors for whichever keys are present."""
+        found = {}
+        with sqlite3.connect(self.path) as conn:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, keys: list[str], vectors: np.ndarray) -> None:
+        """Store one vector per key, replacing existing entries."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in zip(keys, vectors)]
+            )
+
+    def embed(
+        self,
+        texts: list[str],
+        embed_fn: Callable[[list[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Embed texts, calling embed_fn only for texts not already cached.
+
+        Args:
+            texts: Texts to embed.
+            embed_fn: Embeds a list of texts, returning one row per text.
+
+        Returns:
+            Numpy array of shape (n_texts, embedding_dim).
+
+        Raises:
+            RuntimeError: embed_fn returned fewer rows than texts it was
+                given (nothing is cached then).
+        """
+        if not texts:
+            return np.array([])
+
+        keys = [self.key(text) for text in texts]
+        cached = self.get_many(list(set(keys)))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+
+        if missing:
+            new_vectors = embed_fn(list(missing.values()))
+            if len(new_vectors) != len(missing):
+                raise RuntimeError(
+                    f"Embedded {len(new_vectors)} of {len(missing)} uncached texts; "
+                    f"not caching a partial result"
+                )
+            self.put_many(list(missing), new_vectors)
+            cached.update(zip(missing, np.asarray(new_vectors, dtype=np.float32)))
+
+        return np.vstack([cached[key] for key in keys])
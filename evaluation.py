@@ -1,5 +1,5 @@
-import json
-import pickle
+import functools
+import orjson
 import re
 import os
 import numpy as np
@@ -14,35 +14,67 @@ from src.llm_client import LLMClient
 from src.mappings import decode_field
 from src.prompt_builder import build_prompt
 from src.output_cleaner import clean_output
+from src.query_cache import QueryCache, normalize_query
+from src.metadata_index import MetadataIndex, field_tokens, load_metadata, query_tokens
 
 INDEX_PATH = "index/index.faiss"
-METADATA_PATH = "index/metadata.pkl"
+METADATA_PATH = "index/metadata.json"
 TEST_SET_PATH = "evaluation/test_set.json"
 
+# Quote IDs look like MYJADEQT001
+QUOTE_ID_PATTERN = re.compile(r"MYJADEQT\d+", re.IGNORECASE)
+
 # Similarity threshold for retrieval
 CHUNK_SIMILARITY_THRESHOLD = 0.5
 
+# "How many" count queries: (required keywords, field-name patterns) in
+# priority order. A rule fires when every keyword occurs in the query.
+_COUNT_FIELD_RULES = (
+    (("cctv maintenance",), ["cctv_maintenance_contract"]),
+    (("cctv_maintenance",), ["cctv_maintenance_contract"]),
+    (("alarm", "maintenance"), ["under_maintenance_contract"]),
+    (("armoured",), ["armoured_vehicle", "do_you_use_armoured_vehicle"]),
+    (("armored",), ["armoured_vehicle", "do_you_use_armoured_vehicle"]),
+    (("armed guards",), ["armed_guards", "do_you_use_armed_guards"]),
+    (("strong room",), ["strong_room", "do_you_have_a_strong_room"]),
+    (("cctv",), ["cctv", "recording"]),
+    (("alarm",), ["alarm", "do_you_have_alarm"]),
+    (("safe",), ["safe", "certified"]),
+)
+
+# All rule keywords in one alternation (longest first) so a single scan
+# of the query finds every keyword present
+_COUNT_KEYWORD_RE = re.compile("|".join(
+    re.escape(kw) for kw in sorted(
+        {kw for keywords, _ in _COUNT_FIELD_RULES for kw in keywords},
+        key=len, reverse=True
+    )
+))
+
+# Words that make a quote-ID lookup a question about the risk location
+_LOCATION_QUESTION_RE = re.compile("|".join(re.escape(kw) for kw in (
+    "location", "address", "where", "located", "risk location", "city", "state"
+)))
+
+# Words ignored by token_overlap_score
+STOPWORDS = frozenset({"is", "the", "a", "an", "of", "in", "for", "to", "and", "or", "that", "it", "with"})
+
+# Repeated / near-duplicate questions reuse earlier retrieval results
+_retrieval_cache = QueryCache()
+
 
 def extract_quote_id(query: str):
     """Extract quote ID from query string."""
-    match = re.search(r"MYJADEQT\d+", query, re.IGNORECASE)
+    match = QUOTE_ID_PATTERN.search(query)
     return match.group(0).upper() if match else None
 
 
 def score_field_match(field_name: str, query: str) -> int:
     """Score how well a field name matches a query based on word overlap."""
-    normalized = field_name.replace("_label", "").replace("_", " ").lower()
-    field_words = set(normalized.split())
-    query_words = set(query.lower().split())
-    noise = {"does", "is", "the", "a", "an", "for", "of", "in",
-             "what", "which", "how", "many", "have", "has", "this",
-             "with", "do", "you"}
-    field_words -= noise
-    query_words -= noise
-    return len(field_words & query_words)
-
-
-def structured_lookup(query: str, metadata: list) -> str:
+    return len(field_tokens(field_name) & query_tokens(query))
+
+
+def structured_lookup(query: str, meta_index: MetadataIndex) -> str:
     """
     Perform deterministic lookup for a specific field of a specific record.
     Returns formatted answer string if found, else None.
@@ -54,31 +86,14 @@ def structured_lookup(query: str, metadata: list) -> str:
     query_lower = query.lower()
     
     # Special handling for risk_location (stored at chunk level)
-    location_keywords = ["location", "address", "where", "located", "risk location", "city", "state"]
-    if any(kw in query_lower for kw in location_keywords):
-        for chunk in metadata:
-            if chunk.get("quote_id") != quote_id:
-                continue
+    if _LOCATION_QUESTION_RE.search(query_lower):
+        for chunk in meta_index.chunks_for(quote_id):
             risk_location = chunk.get("risk_location")
             if risk_location and isinstance(risk_location, str) and risk_location.strip():
                 return f"Risk Location for {quote_id}: {risk_location}"
     
     # Score all fields across matching chunks
-    best_match = None
-    
-    for chunk in metadata:
-        if chunk.get("quote_id") != quote_id:
-            continue
-        
-        fields = chunk.get("fields", {})
-        if not isinstance(fields, dict):
-            continue
-        
-        for field_name, value in fields.items():
-            score = score_field_match(field_name, query)
-            if score > 0:
-                if best_match is None or score > best_match[0]:
-                    best_match = (score, field_name, value)
+    best_match = meta_index.best_field(quote_id, query_tokens(query))
     
     if best_match and best_match[0] >= 2:
         field_name = best_match[1]
@@ -90,42 +105,52 @@ def structured_lookup(query: str, metadata: list) -> str:
     return None
 
 
-def retrieve_chunks_filtered(query: str, embedder: Embedder, metadata: list, index, top_k: int = 5):
+def retrieve_chunks_filtered(
+    query: str,
+    embedder: Embedder,
+    metadata: list,
+    index,
+    top_k: int = 5,
+    query_vector: np.ndarray = None,
+    meta_index: MetadataIndex = None
+):
     """
     Retrieve chunks with quote_id filtering and similarity threshold.
+    Pass a precomputed query_vector to skip embedding the query, and the
+    MetadataIndex over metadata to filter by its encoded quote_id column.
     Returns (chunks, top_similarity_score).
     """
+    cache_key = (normalize_query(query), top_k)
+    cached = _retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     quote_id = extract_quote_id(query)
-    query_vector = embedder.embed_texts([query])[0]
+    if query_vector is None:
+        query_vector = embedder.embed_texts([query], show_progress=False)[0]
+    
+    # Near-duplicate of a cached question about the same quote
+    cached = _retrieval_cache.get_similar(query_vector, scope=(quote_id, top_k))
+    if cached is not None:
+        return cached
     
     scores, indices = index.search(
-        np.array([query_vector]).astype("float32"),
+        np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1),
         top_k * 3  # Get extra candidates for filtering
     )
     
-    results = []
-    top_similarity = 0.0
+    # Threshold + quote_id filter + top-k as one mask (-1 marks an empty slot)
+    scores, indices = scores[0], indices[0]
+    valid = indices != -1
+    top_similarity = float(scores[valid].max(initial=0.0))
+    keep = valid & (scores >= CHUNK_SIMILARITY_THRESHOLD)
+    if quote_id and valid.any():
+        if meta_index is None:
+            meta_index = MetadataIndex(metadata)
+        keep &= meta_index.quote_mask(quote_id)[np.where(valid, indices, 0)]
+    results = [metadata[indices[i]] for i in np.flatnonzero(keep)[:top_k]]
     
-    for score, idx in zip(scores[0], indices[0]):
-        if idx == -1:
-            continue
-        
-        if score > top_similarity:
-            top_similarity = float(score)
-        
-        if score < CHUNK_SIMILARITY_THRESHOLD:
-            continue
-        
-        chunk = metadata[idx]
-        
-        # Filter by quote_id if present in query
-        if quote_id and chunk.get("quote_id") != quote_id:
-            continue
-        
-        results.append(chunk)
-        
-        if len(results) >= top_k:
-            break
+    _retrieval_cache.put(cache_key, query_vector, (results, top_similarity), scope=(quote_id, top_k))
     
     return results, top_similarity
 
@@ -141,7 +166,6 @@ def token_overlap_score(predicted: str, expected: str) -> float:
     Ignores stopwords: is, the, a, an, of, in, for, to, and, or, that, it, with
     Returns 0.0 to 1.0
     """
-    STOPWORDS = {"is", "the", "a", "an", "of", "in", "for", "to", "and", "or", "that", "it", "with"}
     expected_tokens = [t for t in expected.lower().split() if t not in STOPWORDS]
     if not expected_tokens:
         return 1.0
@@ -155,7 +179,7 @@ def refused_correctly(predicted: str) -> bool:
     return "data not available" in predicted.lower()
 
 
-def analytical_query(query: str, metadata: list) -> str:
+def analytical_query(query: str, meta_index: MetadataIndex) -> str:
     """
     Handle analytical queries that count/aggregate across all proposals.
     Returns answer string if this is an analytical query, else None.
@@ -166,72 +190,34 @@ def analytical_query(query: str, metadata: list) -> str:
     if "how many" not in query_lower:
         return None
     
-    # Build a set of unique quote_ids that have already been counted
-    counted_quotes = set()
-    count = 0
-    
     # Determine what field to look for based on query keywords
-    field_patterns = []
-    yes_values = {"001", "yes", "true", "1"}
-    
-    if "cctv maintenance" in query_lower or "cctv_maintenance" in query_lower:
-        field_patterns = ["cctv_maintenance_contract"]
-    elif "alarm" in query_lower and "maintenance" in query_lower:
-        field_patterns = ["under_maintenance_contract"]
-    elif "armoured" in query_lower or "armored" in query_lower:
-        field_patterns = ["armoured_vehicle", "do_you_use_armoured_vehicle"]
-    elif "armed guards" in query_lower:
-        field_patterns = ["armed_guards", "do_you_use_armed_guards"]
-    elif "strong room" in query_lower:
-        field_patterns = ["strong_room", "do_you_have_a_strong_room"]
-    elif "cctv" in query_lower:
-        field_patterns = ["cctv", "recording"]
-    elif "alarm" in query_lower:
-        field_patterns = ["alarm", "do_you_have_alarm"]
-    elif "safe" in query_lower:
-        field_patterns = ["safe", "certified"]
-    else:
+    keywords_found = {m.group(0) for m in _COUNT_KEYWORD_RE.finditer(query_lower)}
+    field_patterns = next(
+        (patterns for keywords, patterns in _COUNT_FIELD_RULES
+         if all(kw in keywords_found for kw in keywords)),
+        None
+    )
+    if field_patterns is None:
         return None  # Can't determine what to count
     
-    # Iterate all metadata chunks
-    for chunk in metadata:
-        quote_id = chunk.get("quote_id")
-        if not quote_id or quote_id in counted_quotes:
-            continue  # Already counted this proposal
-        
-        fields = chunk.get("fields", {})
-        if not isinstance(fields, dict):
-            continue
-        
-        # Check each field for the pattern
-        for field_name, value in fields.items():
-            field_lower = field_name.lower()
-            
-            # Check if any pattern matches this field name
-            if any(pattern in field_lower for pattern in field_patterns):
-                # Check if value indicates "Yes"
-                value_str = str(value).lower().strip()
-                if value_str in yes_values:
-                    counted_quotes.add(quote_id)
-                    count += 1
-                    break  # Don't double-count this proposal
-    
-    if field_patterns:
-        return str(count)
+    # One reduction over the precomputed (proposal x field) "Yes" matrix
+    return str(meta_index.count_yes(field_patterns))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_resources():
+    """Load metadata, FAISS index and embedder once per process."""
+    metadata = load_metadata(METADATA_PATH)
     
-    return None
+    return metadata, MetadataIndex(metadata), faiss.read_index(INDEX_PATH), Embedder()
 
 
 def run_evaluation():
-    with open(TEST_SET_PATH, "r") as f:
-        test_data = json.load(f)
+    with open(TEST_SET_PATH, "rb") as f:
+        test_data = orjson.loads(f.read())
     
     # Load metadata and index once
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
-    
-    index = faiss.read_index(INDEX_PATH)
-    embedder = Embedder()
+    metadata, meta_index, index, embedder = _load_resources()
     llm = LLMClient()
 
     total = len(test_data)
@@ -240,20 +226,28 @@ def run_evaluation():
 
     print("\n=== RUNNING EVALUATION ===\n")
 
-    for item in test_data:
+    # Embed every question in one batched forward pass
+    query_vectors = embedder.embed_texts(
+        [item["question"] for item in test_data], show_progress=False
+    )
+
+    for item, query_vector in zip(test_data, query_vectors):
         query = item["question"]
         expected = item["expected_answer"]
         
         # Step 1: Try analytical query first (for "how many" questions)
-        prediction = analytical_query(query, metadata)
+        prediction = analytical_query(query, meta_index)
         
         if prediction is None:
             # Step 2: Try structured lookup (deterministic field lookup)
-            prediction = structured_lookup(query, metadata)
+            prediction = structured_lookup(query, meta_index)
         
         if prediction is None:
             # Step 3: Fall back to semantic RAG retrieval
-            retrieved, top_sim = retrieve_chunks_filtered(query, embedder, metadata, index)
+            retrieved, top_sim = retrieve_chunks_filtered(
+                query, embedder, metadata, index,
+                query_vector=query_vector, meta_index=meta_index
+            )
             
             if not retrieved:
                 prediction = "Data not available in proposal records."
@@ -1,22 +1,420 @@
 import faiss
-import pickle
+import math
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
 
+from src.metadata_index import load_metadata, save_metadata
+
+
+# HNSW graph parameters (inner product on normalized vectors = cosine)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# efSearch is raised to at least this many candidates per requested result
+HNSW_EF_PER_RESULT = 4
+
+# IVF probes per query; nlist is chosen as ~sqrt(N) at first add()
+IVF_NPROBE = 8
+
+# IVFPQ: sub-vector length per PQ code and bits per code (8 = 256 centroids,
+# lowered for corpora too small to train that many)
+PQ_DIMS_PER_CODE = 8
+PQ_NBITS = 8
+
+# 8-bit scalar quantizer: per-dimension min/max learned in train(), so
+# normalized float vectors in [-1, 1] keep their resolution (4x smaller)
+SQ_TYPE = faiss.ScalarQuantizer.QT_8bit
+
+# Scalar quantizer per *_sq* index type: int8 codes (trained range) or
+# float16 (no training, near-lossless for normalized embeddings, 2x smaller)
+SQ_TYPES = {
+    "sq8": SQ_TYPE,
+    "hnsw_sq8": SQ_TYPE,
+    "sqfp16": faiss.ScalarQuantizer.QT_fp16,
+    "hnsw_sqfp16": faiss.ScalarQuantizer.QT_fp16,
+}
+
+INDEX_TYPES = (
+    "auto", "flat", "hnsw", "ivf", "ivf_sq8", "ivfpq", "sq8", "hnsw_sq8", "sqfp16", "hnsw_sqfp16"
+)
+
+# Index types sized from the corpus (nlist), so created once vectors exist
+IVF_INDEX_TYPES = ("ivf", "ivf_sq8", "ivfpq")
+
+# "auto": exact search below this many vectors (where a flat scan is as fast
+# as a graph walk and has perfect recall), the HNSW graph from there on, and
+# int8 inverted lists for corpora large enough that vector bytes dominate
+AUTO_FLAT_MAX_VECTORS = 10_000
+AUTO_ANN_INDEX_TYPE = "hnsw_sqfp16"
+AUTO_INT8_MIN_VECTORS = 1_000_000
+AUTO_INT8_INDEX_TYPE = "ivf_sq8"
+
+
+def resolve_index_type(index_type: str, n_vectors: int) -> str:
+    """The concrete index type for a corpus size ("auto" picks flat, HNSW or IVF-SQ8)."""
+    if index_type != "auto":
+        return index_type
+    if n_vectors < AUTO_FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors < AUTO_INT8_MIN_VECTORS:
+        return AUTO_ANN_INDEX_TYPE
+    return AUTO_INT8_INDEX_TYPE
+
+# with_refine(): candidates fetched from the quantized index per result,
+# re-scored against the exact float32 vectors
+REFINE_K_FACTOR = 4
+
+
+def create_index(dim: int, index_type: str = "hnsw", n_vectors: int = 0):
+    """
+    Create an empty inner-product FAISS index.
+
+    Args:
+        dim: Embedding dimension.
+        index_type: "auto" (see resolve_index_type()), "flat"
+            (exhaustive), "hnsw" (graph ANN), "ivf"
+            (inverted lists), "ivf_sq8" (inverted lists over int8 codes),
+            "ivfpq" (inverted lists over product-quantized codes, for large
+            corpora), "sq8" / "sqfp16" (exhaustive over int8 / float16
+            codes) or "hnsw_sq8" / "hnsw_sqfp16" (graph ANN over int8 /
+            float16 codes). The IVF types and the int8 variants need
+            train() before add().
+        n_vectors: Expected corpus size, used to size the IVF nlist and
+            to resolve "auto".
+    """
+    index_type = resolve_index_type(index_type, n_vectors)
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    if index_type in ("sq8", "sqfp16"):
+        return faiss.IndexScalarQuantizer(dim, SQ_TYPES[index_type], faiss.METRIC_INNER_PRODUCT)
+
+    if index_type in ("hnsw_sq8", "hnsw_sqfp16"):
+        index = faiss.IndexHNSWSQ(dim, SQ_TYPES[index_type], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    if index_type == "ivf":
+        nlist = max(1, int(math.sqrt(n_vectors)))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index
+
+    if index_type == "ivf_sq8":
+        nlist = max(1, int(math.sqrt(n_vectors)))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFScalarQuantizer(
+            quantizer, dim, nlist, SQ_TYPE, faiss.METRIC_INNER_PRODUCT
+        )
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index
+
+    if index_type == "ivfpq":
+        nlist = max(1, int(math.sqrt(n_vectors)))
+        m = max(1, dim // PQ_DIMS_PER_CODE)
+        while dim % m:
+            m -= 1
+        nbits = min(PQ_NBITS, int(math.log2(n_vectors))) if n_vectors > 1 else PQ_NBITS
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, max(1, nbits), faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index
+
+    raise ValueError(f"Unknown index type: {index_type!r} (expected one of {INDEX_TYPES})")
+
+
+def with_refine(index, k_factor: int = REFINE_K_FACTOR):
+    """
+    Wrap a quantized index so its results are re-ranked exactly.
+
+    The wrapper also stores the float32 vectors; each search fetches
+    k_factor * k candidates from the quantized index and re-scores them
+    against those, recovering the recall lost to quantization.
+    """
+    refined = faiss.IndexRefineFlat(index)
+    refined.k_factor = k_factor
+    return refined
+
+
+def set_parallel_mode(index, mode: int) -> bool:
+    """
+    Set the OpenMP parallelisation mode of an IVF index.
+
+    0 splits a batch across queries (the default), 1 splits one query's
+    probed lists across threads and 2 splits both, which lowers latency
+    for single-vector searches when OpenMP has more than one thread.
+    Indexes without inverted lists (flat, HNSW) are left unchanged.
+
+    Returns:
+        True if the mode was applied.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return False
+    ivf.parallel_mode = mode
+    return True
+
+
+def hnsw_ef_search(index, k: int) -> int:
+    """efSearch for a k-result query: the index setting, raised to HNSW_EF_PER_RESULT * k."""
+    return max(index.hnsw.efSearch, k * HNSW_EF_PER_RESULT)
+
+
+# Kept alive for as long as any GPU index copy made by to_gpu() exists
+_gpu_resources = None
+
+
+def to_gpu(index, device: int = 0):
+    """
+    Copy an index to a GPU for searching.
+
+    Returns the CPU index unchanged when this FAISS build has no GPU
+    support, no GPU is visible, or the index type has no GPU version
+    (e.g. HNSW).
+    """
+    global _gpu_resources
+    if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+        return index
+    if _gpu_resources is None:
+        _gpu_resources = faiss.StandardGpuResources()
+    try:
+        return faiss.index_cpu_to_gpu(_gpu_resources, device, index)
+    except RuntimeError:
+        return index
+
+
+def _refine_params(index, base_params):
+    """Parameters for a with_refine() index, passing base_params to the quantized index."""
+    if base_params is None:
+        return None
+    return faiss.IndexRefineSearchParameters(k_factor=index.k_factor, base_index_params=base_params)
+
+
+def search_params(index, k: int):
+    """Per-search parameters for an unfiltered k-result search (None if defaults do)."""
+    if isinstance(index, faiss.IndexRefine):
+        base = faiss.downcast_index(index.base_index)
+        return _refine_params(index, search_params(base, int(k * index.k_factor)))
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=hnsw_ef_search(index, k))
+    return None
+
+
+def id_filter_params(index, ids, k: int = 0):
+    """
+    Search parameters restricting a search to the given vector ids.
+
+    The id filter is applied inside the FAISS scan (IDSelectorBatch), so
+    no candidates outside the subset need to be fetched and discarded.
+    Flat and IVF indexes (every list probed) search the subset
+    exhaustively. An HNSW search still walks the whole graph and only
+    filters what it visits, so a small subset can be missed; use
+    subset_search() when the subset must be searched exactly.
+    """
+    if isinstance(index, faiss.IndexRefine):
+        # Filter the candidate search; the exact re-rank only sees its results
+        base = faiss.downcast_index(index.base_index)
+        return _refine_params(index, id_filter_params(base, ids, int(k * index.k_factor)))
+    sel = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=hnsw_ef_search(index, k))
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=sel)
+    return faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nlist)
+
+
+def _is_hnsw(index) -> bool:
+    """True for an HNSW index, or a with_refine() wrapper around one."""
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.base_index)
+    return isinstance(index, faiss.IndexHNSW)
+
+
+def subset_search(index, query_vector, ids, threshold: float, k: int):
+    """
+    threshold_search() restricted to the given vector ids, exhaustively for
+    every index type.
+
+    Flat and IVF indexes take an id filter inside the scan. For HNSW the
+    subset's stored vectors are reconstructed and scored directly (one
+    small matrix-vector product), since a filtered graph walk can miss
+    them; a with_refine() wrapper reconstructs its exact float32 copies.
+    """
+    if not _is_hnsw(index):
+        return threshold_search(
+            index, query_vector, threshold, k, params=id_filter_params(index, ids, k)
+        )
+
+    ids = np.asarray(ids, dtype="int64")
+    query = np.ascontiguousarray(query_vector, dtype="float32").reshape(-1)
+    subset_scores = index.reconstruct_batch(ids) @ query
+
+    # Above-threshold hits best first; the best score alone if there are none
+    hits = np.flatnonzero(subset_scores >= threshold)
+    if hits.size == 0:
+        hits = np.arange(ids.size)
+    order = hits[np.argsort(-subset_scores[hits], kind="stable")][:k]
+    scores = np.full((1, k), -np.inf, dtype="float32")
+    indices = np.full((1, k), -1, dtype="int64")
+    scores[0, :order.size] = subset_scores[order]
+    indices[0, :order.size] = ids[order]
+    return scores, indices
+
+
+def threshold_search(index, query_vector, threshold: float, k: int, params=None):
+    """
+    Search one vector for up to k neighbours scoring at least threshold.
+
+    The threshold is pushed into FAISS as a range search, so vectors below
+    it are never collected or ranked; only the hits are sorted. Falls back
+    to a plain k-NN search when the index has no range search (e.g. a
+    with_refine() wrapper) and when nothing reaches the threshold, so the
+    best (below-threshold) score is still reported.
+
+    Returns:
+        (scores, indices) of shape (1, k), best first, padded with -1 ids
+        like index.search().
+    """
+    query = np.ascontiguousarray(query_vector, dtype="float32").reshape(1, -1)
+    try:
+        _, distances, labels = index.range_search(query, threshold, params=params)
+    except RuntimeError:
+        distances = labels = np.empty(0)
+    if labels.size == 0:
+        return index.search(query, k, params=params)
+
+    order = np.argsort(-distances, kind="stable")[:k]
+    scores = np.full((1, k), -np.inf, dtype="float32")
+    indices = np.full((1, k), -1, dtype="int64")
+    scores[0, :order.size] = distances[order]
+    indices[0, :order.size] = labels[order]
+    return scores, indices
+
+
+# Micro-batching: how long the search worker waits for more queries to
+# join a batch, and the largest batch it will issue in one search() call
+BATCH_WAIT_MS = float(os.getenv("FAISS_BATCH_WAIT_MS", "2"))
+MAX_BATCH_SIZE = 64
+
+
+class BatchSearcher:
+    """
+    Funnel concurrent single-vector searches into batched index.search calls.
+
+    Request threads enqueue a vector and block on a Future; one worker
+    thread stacks whatever arrived within BATCH_WAIT_MS into a (B, d)
+    matrix, runs a single search and hands each caller its row. Meant to
+    be used with faiss.omp_set_num_threads(1) so concurrent requests do
+    not each fan out across all cores.
+    """
+
+    def __init__(self, index, max_wait_ms: float = BATCH_WAIT_MS, max_batch: int = MAX_BATCH_SIZE):
+        self.index = index
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Reused query matrix; only the worker thread writes to it
+        self._buffer = np.empty((max_batch, index.d), dtype="float32")
+        self._worker = threading.Thread(target=self._run, name="faiss-batch-search", daemon=True)
+        self._worker.start()
+
+    def search(self, query_vector, top_k: int):
+        """Search one vector; returns (scores, indices) with shape (1, top_k)."""
+        vector = np.asarray(query_vector, dtype="float32").reshape(-1)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                return self.index.search(
+                    vector.reshape(1, -1), top_k, params=search_params(self.index, top_k)
+                )
+            self._queue.put((vector, top_k, future))
+        return future.result()
+
+    def close(self):
+        """Stop the worker thread once queued searches are done."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(item)
+            self._search_batch(batch)
+
+    def _search_batch(self, batch):
+        vectors = self._buffer[:len(batch)]
+        for row, (vector, _, _) in enumerate(batch):
+            vectors[row] = vector
+        k = max(top_k for _, top_k, _ in batch)
+        try:
+            scores, indices = self.index.search(vectors, k, params=search_params(self.index, k))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for row, (_, top_k, future) in enumerate(batch):
+            future.set_result((scores[row:row + 1, :top_k], indices[row:row + 1, :top_k]))
+
 
 class FAISSIndex:
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, index_type: str = "hnsw_sq8"):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type!r} (expected one of {INDEX_TYPES})")
         self.dim = dim
-        self.index = faiss.IndexFlatIP(dim)  # cosine similarity
+        self.index_type = index_type
+        # IVF and "auto" types are sized from the first batch of vectors, so they are created in add()
+        deferred = index_type in IVF_INDEX_TYPES or index_type == "auto"
+        self.index = None if deferred else create_index(dim, index_type)
         self.metadata = []
 
     def add(self, vectors, metadatas):
-        self.index.add(np.array(vectors).astype("float32"))
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self.index is None:
+            self.index = create_index(self.dim, self.index_type, len(vectors))
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
         self.metadata.extend(metadatas)
 
     def search(self, query_vector, top_k=5):
+        if self.index is None:
+            return []
         scores, indices = self.index.search(
-            np.array([query_vector]).astype("float32"), top_k
+            np.ascontiguousarray(query_vector, dtype="float32").reshape(1, -1), top_k
         )
         results = []
         for idx, score in zip(indices[0], scores[0]):
@@ -29,11 +427,10 @@ class FAISSIndex:
         return results
 
     def save(self, index_path, metadata_path):
+        # Same metadata format as the serving path (metadata.json via orjson)
         faiss.write_index(self.index, index_path)
-        with open(metadata_path, "wb") as f:
-            pickle.dump(self.metadata, f)
+        save_metadata(metadata_path, self.metadata)
 
     def load(self, index_path, metadata_path):
         self.index = faiss.read_index(index_path)
-        with open(metadata_path, "rb") as f:
-            self.metadata = pickle.load(f)
+        self.metadata = load_metadata(metadata_path)
@@ -7,7 +7,7 @@ and NaN float values.
 
 Parse Strategy:
     1. Defensive sanitization (smart quotes -> ASCII, strip BOM, remove control chars)
-    2. Direct json.loads() attempt
+    2. Direct orjson.loads() attempt (stdlib json for NaN/Infinity literals)
     3. Fallback with trailing comma removal
     4. Never raises exceptions - always returns None on parse failures
 
@@ -25,6 +25,14 @@ Usage:
     >>> if data:  # None if parse failed
     ...     process(data)
 """
+import json
+import logging
+import math
+import re
+
+import orjson
+
+logger = logging.getLogger("ja_assure_rag.json_cleaner")
 
 SMART_QUOTES = {
     "\u201c": '"',
@@ -51,6 +59,14 @@ def _sanitize_json_string(raw: str) -> str:
     return s
 
 
+def loads_json(s: str):
+    """orjson first; stdlib json accepts the NaN/Infinity literals orjson rejects."""
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        return json.loads(s)
+
+
 def parse_json_cell(cell):
     """
     Parse a single Excel cell that is expected to contain JSON.
@@ -75,13 +91,13 @@ def parse_json_cell(cell):
     sanitized = _sanitize_json_string(raw)
 
     try:
-        return json.loads(sanitized)
+        return loads_json(sanitized)
     except json.JSONDecodeError:
         pass
 
     try:
         fixed = re.sub(r",\s*([}\]])", r"\1", sanitized)
-        return json.loads(fixed)
+        return loads_json(fixed)
     except json.JSONDecodeError as exc:
         logger.error("JSON parse failure: %s -- first 200 chars: %s", exc, sanitized[:200])
         return None
@@ -1,6 +1,7 @@
-import json as _json
 import logging
 
+from loader.json_cleaner import loads_json
+
 logger = logging.getLogger("ja_assure_rag.section_extractor")
 
 SECTION_COLUMNS = [
@@ -42,7 +43,6 @@ def validate_proposal_completeness(row_data: dict) -> dict:
         "business_profile", "sum_assured", "cctv", "alarm",
         "transit_and_gaurds", "claim_history", "additional_details"
     ]
-    import json
     populated = 0
     missing = []
     for section in KEY_SECTIONS:
@@ -59,7 +59,7 @@ def validate_proposal_completeness(row_data: dict) -> dict:
             except (TypeError, ValueError):
                 pass
         try:
-            parsed = json.loads(str(val)) if isinstance(val, str) else val
+            parsed = loads_json(str(val)) if isinstance(val, str) else val
         except Exception:
             missing.append(section)
             continue
@@ -37,20 +37,26 @@ Data Coverage:
 """
 from __future__ import annotations
 
+import atexit
 import os
-import json
-import pickle
 import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 import faiss
 import numpy as np
+import orjson
 
 from loader.excel_loader import load_excel
 from loader.json_cleaner import parse_json_cell
-from loader.section_extractor import extract_sections
+from loader.section_extractor import SECTION_COLUMNS, extract_sections
 from src.text_builder import build_section_text
 from src.llm_client import LLMClient
 from src.qa_store import PredefinedQAStore
@@ -62,35 +68,182 @@ from src.query_classifier import (
     QueryClassification,
 )
 from src.prompt_builder import build_prompt, get_refusal_message
-from src.output_cleaner import clean_output
+from src.output_cleaner import clean_fragment, clean_output
 from src.analytical_engine import AnalyticalEngine
-from src.mappings import decode_field
+from src.mappings import DECODE_LUT, decode_field
 from src.query_parser import QueryParser, ParsedQuery
 from src.query_executor import SmartQueryExecutor, QueryResult
 from src.answer_formatter import format_answer, format_classified_response
 from src.compound_query_handler import CompoundQueryHandler
-from embeddings.embedder import Embedder, cosine_similarity
+from src.query_cache import QueryCache, normalize_query
+from embeddings.embedder import Embedder
+from embeddings.embedding_cache import EmbeddingCache
+from index.faiss_index import (
+    BatchSearcher,
+    create_index,
+    resolve_index_type,
+    search_params,
+    set_parallel_mode,
+    subset_search,
+    to_gpu,
+    with_refine,
+)
+from src.metadata_index import (
+    MetadataIndex,
+    field_tokens,
+    load_metadata,
+    query_tokens,
+    save_metadata,
+)
 
 # Configuration
 EXCEL_PATH = "data/JADE-Fields DB(Integrated)_Mentor Copy.xlsx"
 SHEET_NAME = "tbl_MY"
 INDEX_PATH = "index/index.faiss"
-METADATA_PATH = "index/metadata.pkl"
+METADATA_PATH = "index/metadata.json"
 PREDEFINED_QA_PATH = "evaluation/predefined_qa.json"
 LOG_DIR = "logs"
-LOG_FILE = "logs/query_log.json"
+LOG_FILE = "logs/query_log.jsonl"
 
 # Similarity thresholds
 PREDEFINED_SIMILARITY_THRESHOLD = 0.85
 CHUNK_SIMILARITY_THRESHOLD = 0.5
 TOP_K_CHUNKS = 5
 
+# Sheets with at least this many rows are parsed by a process pool
+INGEST_PARALLEL_MIN_ROWS = int(os.getenv("INGEST_PARALLEL_MIN_ROWS", "1000"))
+
+# Texts per embedding forward pass when indexing the whole corpus
+INGEST_BATCH_SIZE = 256
+
+# FAISS index built by build_index (see index.faiss_index.INDEX_TYPES);
+# vectors are stored as float16, half the memory and I/O of float32
+# "auto" searches small corpora exactly and switches to the float16 HNSW
+# graph once the corpus grows (see index.faiss_index.resolve_index_type)
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+# FAISS_INDEX_REFINE=1 keeps the float32 vectors beside a quantized index and
+# re-ranks its candidates exactly (see index.faiss_index.with_refine)
+FAISS_INDEX_REFINE = os.getenv("FAISS_INDEX_REFINE", "0") == "1"
+
+# Intra-op threads for torch (embedder); the API threadpool already runs
+# requests in parallel, so each one gets a bounded fan-out. FAISS runs
+# single-threaded and batches concurrent searches instead.
+COMPUTE_THREADS = int(os.getenv("COMPUTE_THREADS", str(max(1, min(8, (os.cpu_count() or 2) // 2)))))
+
+# PARSE_WHILE_EMBEDDING=1 trades LLM cost for latency: the (network-bound)
+# LLM query parse starts while the query is embedded for the semantic
+# predefined Q&A match, and every query that match answers wastes that
+# Cerebras call. Off by default; verbatim predefined questions are
+# answered before either starts.
+PARSE_WHILE_EMBEDDING = os.getenv("PARSE_WHILE_EMBEDDING", "0") == "1"
+
+# Chunk and predefined-question embeddings keyed by model + text hash, so
+# rebuilds and restarts only embed changed text
+EMBED_CACHE_PATH = "index/embed_cache.sqlite"
+
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Place and business-type keywords recognised in cross-proposal queries,
+# in priority order (the first listed keyword found in a query wins)
+LOCATION_NAMES = (
+    "penang", "johor", "selangor", "kuala lumpur", "kedah", "perak",
+    "sabah", "sarawak", "melaka", "pahang", "kelantan", "terengganu",
+    "negeri sembilan", "perlis", "putrajaya", "labuan", "johor bahru",
+    "george town", "ipoh", "kuching", "kota kinabalu", "alor setar",
+    "shah alam", "petaling jaya", "subang", "klang", "cyberjaya",
+    "muar", "batu pahat", "larkin", "senai"
+)
+BUSINESS_TYPES = (
+    "pawn", "pawn shop", "pawnshop", "pawnbroker", "money changer",
+    "money exchange", "forex", "fx exchange", "exchange", "jeweller",
+    "goldsmith", "gold", "jewelry", "jewellery"
+)
+
+# Narrower lists that send a query away from the aggregate analytical handler
+ANALYTICAL_EXCLUDED_LOCATIONS = (
+    "penang", "johor", "selangor", "kuala lumpur", "kedah", "perak",
+    "sabah", "sarawak", "melaka", "pahang", "kelantan", "terengganu",
+    "negeri sembilan", "perlis", "putrajaya", "labuan", "johor bahru",
+    "george town", "ipoh", "kuching", "kota kinabalu", "muar"
+)
+ANALYTICAL_EXCLUDED_BUSINESS_TYPES = (
+    "pawn", "pawnshop", "money changer", "forex", "exchange", "jeweller", "goldsmith"
+)
+
+# Words that make a quote-ID lookup a question about the risk location
+LOCATION_QUESTION_KEYWORDS = (
+    "location", "address", "where", "located", "risk location", "city", "state"
+)
+
+def _keyword_regex(keywords: tuple[str, ...]) -> re.Pattern:
+    """
+    One-pass matcher for a keyword list.
+    
+    The alternation sits in a lookahead, so finditer() reports a match at
+    every position (overlapping keywords included), naming the earliest
+    listed keyword that matches there.
+    """
+    return re.compile("(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))")
+
+_LOCATION_RE = _keyword_regex(LOCATION_NAMES)
+_BUSINESS_TYPE_RE = _keyword_regex(BUSINESS_TYPES)
+_ANALYTICAL_EXCLUDED_RE = _keyword_regex(
+    ANALYTICAL_EXCLUDED_LOCATIONS + ANALYTICAL_EXCLUDED_BUSINESS_TYPES
+)
+_LOCATION_QUESTION_RE = _keyword_regex(LOCATION_QUESTION_KEYWORDS)
+
+def _first_keyword(
+    regex: re.Pattern,
+    keywords: tuple[str, ...],
+    text: str
+) -> Optional[str]:
+    """Return the earliest-listed keyword occurring anywhere in text, or None."""
+    found = {m.group(1) for m in regex.finditer(text)}
+    return min(found, key=keywords.index) if found else None
+
 # Module-level lazy singletons — created on first query, not at import time
 _scope_classifier: Optional[QueryClassifier] = None
 _partial_engine: Optional[PartialAnswerEngine] = None
 _compound_handler: Optional[CompoundQueryHandler] = None
+_query_executor: Optional[SmartQueryExecutor] = None
+# Metadata list the partial/compound handlers were built from; they are
+# rebuilt when load_index() starts serving a different list
+_handler_metadata: Optional[list[dict]] = None
+
+# Runs QueryParser.parse concurrently with the predefined Q&A embedding
+_parse_pool: Optional[ThreadPoolExecutor] = (
+    ThreadPoolExecutor(max_workers=COMPUTE_THREADS, thread_name_prefix="query-parse")
+    if PARSE_WHILE_EMBEDDING else None
+)
+
+# Repeated questions reuse their retrieval results (exact text or
+# near-duplicate embedding); dropped whenever a new index is served
+_retrieval_cache = QueryCache()
+
+# FAISS index + chunk metadata, read from disk once per process (see load_index).
+# FAISS_INDEX_MMAP=1 memory-maps the index file instead of reading it into RAM.
+FAISS_INDEX_MMAP = os.getenv("FAISS_INDEX_MMAP", "0") == "1"
+# FAISS_PARALLEL_MODE (IVF only): 0 = across queries, 1/2 = within a query
+FAISS_PARALLEL_MODE = os.getenv("FAISS_PARALLEL_MODE")
+# FAISS_USE_GPU=1 serves unfiltered searches from a GPU copy of the index
+# (flat/IVF types; filtered searches stay on the CPU index)
+FAISS_USE_GPU = os.getenv("FAISS_USE_GPU", "0") == "1"
+_index: Optional[faiss.Index] = None
+_metadata: Optional[list[dict]] = None
+_searcher: Optional[BatchSearcher] = None
+_meta_index: Optional[MetadataIndex] = None
+_index_mtimes: Optional[tuple[float, float]] = None
+_index_lock = threading.Lock()
+# load_index() re-stats the index files at most this often; a query calls
+# it several times, and the files only change on a rebuild
+INDEX_RELOAD_CHECK_SECONDS = float(os.getenv("INDEX_RELOAD_CHECK_SECONDS", "1"))
+_index_checked_at = 0.0
+
+# Query log lines are written by one background thread so the request
+# path only enqueues (see log_query)
+_log_queue: "queue.Queue[Optional[bytes]]" = queue.Queue()
+_log_writer: Optional[threading.Thread] = None
+_log_writer_lock = threading.Lock()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -125,7 +278,10 @@ def log_query(
     answer: str
 ) -> None:
     """
-    Log query details to JSON file for audit trail.
+    Append query details to the JSONL audit log (one JSON object per line).
+    
+    The line is serialized here and written by a background thread, so
+    the request never waits on file I/O.
     
     Args:
         query: User's question
@@ -145,44 +301,249 @@ def log_query(
         "answer_length": len(answer)
     }
     
+    _start_log_writer()
+    _log_queue.put(orjson.dumps(log_entry, option=orjson.OPT_APPEND_NEWLINE))
+
+def _start_log_writer() -> None:
+    """Start the background query-log writer on first use."""
+    global _log_writer
+    if _log_writer is not None:
+        return
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = threading.Thread(target=_write_logs, name="query-log-writer", daemon=True)
+            _log_writer.start()
+            atexit.register(_stop_log_writer)
+
+def _write_logs() -> None:
+    """Drain the log queue into LOG_FILE, flushing whenever the queue runs dry."""
     try:
-        log_path = Path(LOG_FILE)
+        f = open(LOG_FILE, "ab")
+    except OSError as e:
+        logger.warning(f"Failed to open query log: {e}")
+        f = None
+    
+    while True:
+        line = _log_queue.get()
+        try:
+            if line is None:
+                if f is not None:
+                    f.close()
+                return
+            if f is not None:
+                f.write(line)
+                if _log_queue.empty():
+                    f.flush()
+        except Exception as e:
+            logger.warning(f"Failed to write query log: {e}")
+        finally:
+            _log_queue.task_done()
+
+def _stop_log_writer() -> None:
+    """Flush queued log lines and stop the writer (registered with atexit)."""
+    _log_queue.put(None)
+    if _log_writer is not None:
+        _log_writer.join(timeout=5)
+
+def read_logs() -> list[dict]:
+    """
+    Read the JSONL audit log, including entries still waiting to be written.
+    
+    Returns:
+        Log entries in the order they were logged (empty if there is no log)
+    """
+    if _log_writer is not None:
+        _log_queue.join()
+    
+    log_path = Path(LOG_FILE)
+    if not log_path.exists():
+        return []
+    with open(log_path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+def convert_logs_to_json(output_path: str = "logs/query_log.json") -> int:
+    """
+    Convert the JSONL audit log into a single JSON array for offline analysis.
+    
+    Args:
+        output_path: Destination JSON file
         
-        if log_path.exists():
-            with open(log_path, "r") as f:
-                logs = json.load(f)
-        else:
-            logs = []
+    Returns:
+        Number of log entries written
+    """
+    logs = read_logs()
+    
+    with open(output_path, "wb") as f:
+        f.write(orjson.dumps(logs, option=orjson.OPT_INDENT_2))
+    
+    return len(logs)
+
+def _index_file_mtimes() -> Optional[tuple[float, float]]:
+    """Modification times of the index and metadata files (None if either is missing)."""
+    try:
+        return os.path.getmtime(INDEX_PATH), os.path.getmtime(METADATA_PATH)
+    except OSError:
+        return None
+
+def load_index(reload: bool = False) -> tuple[Optional[faiss.Index], list[dict]]:
+    """
+    Return the FAISS index and chunk metadata, loading them on first use.
+    
+    The pair is cached in memory and re-read only when either file's
+    modification time changes (e.g. another process rebuilt the index).
+    The files are checked at most every INDEX_RELOAD_CHECK_SECONDS.
+    
+    Args:
+        reload: Re-read both files from disk (e.g. after a rebuild)
+        
+    Returns:
+        Tuple of (index, metadata), or (None, []) if the index is not built
+    """
+    global _index_mtimes, _index_checked_at
+    
+    now = time.monotonic()
+    if not reload and _index is not None and now - _index_checked_at < INDEX_RELOAD_CHECK_SECONDS:
+        return _index, _metadata
+    
+    mtimes = _index_file_mtimes()
+    if not reload and _index is not None and (mtimes is None or mtimes == _index_mtimes):
+        _index_checked_at = now
+        return _index, _metadata
+    
+    with _index_lock:
+        if mtimes is None:
+            # Files removed: keep serving what is loaded, if anything
+            return (_index, _metadata) if _index is not None else (None, [])
         
-        logs.append(log_entry)
+        if reload or _index is None or mtimes != _index_mtimes:
+            io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if FAISS_INDEX_MMAP else 0
+            index = faiss.read_index(INDEX_PATH, io_flags)
+            metadata = load_metadata(METADATA_PATH)
+            _install_index(index, metadata)
+            _index_mtimes = mtimes
+            _index_checked_at = time.monotonic()
+            logger.info(f"Loaded FAISS index ({index.ntotal} vectors) and {len(metadata)} metadata chunks")
         
-        with open(log_path, "w") as f:
-            json.dump(logs, f, indent=2)
-    except Exception as e:
-        logger.warning(f"Failed to write query log: {e}")
+        return _index, _metadata
 
-def run_ingestion() -> tuple[list[dict], list[dict]]:
+def _install_index(index: faiss.Index, metadata: list[dict]) -> None:
+    """Make an index + metadata pair the one served to queries (caller holds _index_lock)."""
+    global _index, _metadata, _searcher, _meta_index
+    
+    if FAISS_PARALLEL_MODE is not None and set_parallel_mode(index, int(FAISS_PARALLEL_MODE)):
+        logger.info(f"FAISS parallel_mode set to {FAISS_PARALLEL_MODE}")
+    
+    _meta_index = MetadataIndex(metadata)
+    _index, _metadata = index, metadata
+    _retrieval_cache.clear()
+    
+    search_index = index
+    if FAISS_USE_GPU:
+        search_index = to_gpu(index)
+        if search_index is index:
+            logger.warning("FAISS_USE_GPU is set but the index cannot be searched on a GPU; using CPU")
+    
+    # Concurrent queries are searched in batches by one worker thread
+    if _searcher is not None:
+        _searcher.close()
+    _searcher = BatchSearcher(search_index)
+
+def load_index_snapshot() -> tuple[
+    Optional[faiss.Index], list[dict], Optional[MetadataIndex], Optional[BatchSearcher]
+]:
     """
-    Run the full ingestion pipeline: load Excel -> parse JSON -> extract sections -> build text.
+    Return the served index, metadata, metadata index and searcher together.
+    
+    The four are read under _index_lock, so they always come from the same
+    _install_index call; a concurrent reload cannot pair one index's chunk
+    ids with another's metadata.
     
     Returns:
-        Tuple of (section_chunks, text_chunks)
+        Tuple of (index, metadata, meta_index, searcher), or
+        (None, [], None, None) if the index is not built
     """
-    logger.info("Starting data ingestion...")
+    load_index()
+    with _index_lock:
+        if _index is None:
+            return None, [], None, None
+        return _index, _metadata, _meta_index, _searcher
+
+def load_metadata_index() -> Optional[MetadataIndex]:
+    """Return the per-quote metadata index (None if the index is not built)."""
+    _, _, meta_index, _ = load_index_snapshot()
+    return meta_index
+
+def get_query_executor() -> SmartQueryExecutor:
+    """
+    Return the shared SmartQueryExecutor, rebuilt when the metadata index changes.
     
-    df = load_excel(EXCEL_PATH, sheet_name=SHEET_NAME)
-    logger.info(f"Loaded {len(df)} records from Excel")
+    The executor precomputes per-chunk name columns on first use, so it is
+    kept across queries rather than created per query.
+    """
+    global _query_executor
+    meta_index = load_metadata_index()
+    executor = _query_executor
+    if executor is None or meta_index is None or executor.meta_index is not meta_index:
+        executor = SmartQueryExecutor(METADATA_PATH, meta_index)
+        _query_executor = executor
+    return executor
+
+# Raw values stored as-is instead of being decoded
+_MISSING_VALUES = frozenset({None, "", -1, "-1"})
+
+def _decode_into(decoded: dict, raw_fields: dict) -> None:
+    """Decode one dict of raw field values into *decoded* (DECODE_LUT first)."""
+    for field_name, value in raw_fields.items():
+        if isinstance(value, (list, dict)):
+            if not value:
+                decoded[field_name] = str(value)
+                continue
+        elif value in _MISSING_VALUES:
+            decoded[field_name] = str(value) if value is not None else ""
+            continue
+        
+        value_str = str(value)
+        label = DECODE_LUT.get(field_name, {}).get(value_str)
+        decoded[field_name] = label if label is not None else decode_field(field_name, value_str)
+
+def _decode_chunk_fields(raw_fields, chunk_metadata: dict) -> dict:
+    """Flat decoded_fields dict of one text chunk (raw section data + location/user)."""
+    decoded_flat = {}
     
-    all_sections = []
-    for _, row in df.iterrows():
-        row_dict = row.to_dict()
-        sections = extract_sections(row_dict, parse_json_cell)
-        all_sections.extend(sections)
+    if isinstance(raw_fields, dict):
+        _decode_into(decoded_flat, raw_fields)
     
-    logger.info(f"Extracted {len(all_sections)} section chunks")
+    elif isinstance(raw_fields, list):
+        for item in raw_fields:
+            if isinstance(item, dict):
+                _decode_into(decoded_flat, item)
+    
+    decoded_flat["risk_location"] = str(chunk_metadata.get("risk_location", ""))
+    decoded_flat["user_name"] = str(chunk_metadata.get("user_name", ""))
+    return decoded_flat
+
+def _ingest_row(row_dict: dict) -> tuple[list[dict], list[dict]]:
+    """
+    Extract the section chunks of one Excel row and build their text chunks.
+    
+    Top-level so it can run in ingestion worker processes. Each JSON
+    section cell is parsed once, here, so parsing runs in the workers and
+    extract_sections / the completeness check receive dicts and lists.
+    Field values are decoded here too, so build_index only assembles
+    metadata.
+    
+    Returns:
+        Tuple of (section_chunks, text_chunks) for this row
+    """
+    for column in SECTION_COLUMNS:
+        if column in row_dict:
+            row_dict[column] = parse_json_cell(row_dict[column])
+    
+    # Cells are already parsed: extract_sections must not parse them again
+    sections = extract_sections(row_dict, lambda cell: cell)
     
     text_chunks = []
-    for chunk in all_sections:
+    for chunk in sections:
         text = build_section_text(chunk)
         
         if text:
@@ -191,14 +552,52 @@ def run_ingestion() -> tuple[list[dict], list[dict]]:
                 "section": chunk["section"],
                 "text": text,
                 "fields": chunk["data"],
+                "decoded_fields": _decode_chunk_fields(chunk["data"], chunk["metadata"]),
                 "metadata": chunk["metadata"]
             })
     
+    return sections, text_chunks
+
+def run_ingestion() -> tuple[list[dict], list[dict]]:
+    """
+    Run the full ingestion pipeline: load Excel -> parse JSON -> extract sections -> build text.
+    
+    Rows are independent, so sheets of INGEST_PARALLEL_MIN_ROWS rows or more
+    are processed by a process pool; smaller sheets run inline.
+    
+    Returns:
+        Tuple of (section_chunks, text_chunks)
+    """
+    logger.info("Starting data ingestion...")
+    
+    df = load_excel(EXCEL_PATH, sheet_name=SHEET_NAME)
+    logger.info(f"Loaded {len(df)} records from Excel")
+    
+    # Plain dict per row: no per-row Series boxing as with iterrows()
+    rows = df.to_dict(orient="records")
+    
+    if len(rows) >= INGEST_PARALLEL_MIN_ROWS:
+        workers = os.cpu_count() or 1
+        # A few chunks per worker: low IPC overhead, still balanced
+        chunksize = max(1, len(rows) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            per_row = list(executor.map(_ingest_row, rows, chunksize=chunksize))
+    else:
+        per_row = [_ingest_row(row_dict) for row_dict in rows]
+    
+    all_sections = list(chain.from_iterable(sections for sections, _ in per_row))
+    text_chunks = list(chain.from_iterable(chunks for _, chunks in per_row))
+    
+    logger.info(f"Extracted {len(all_sections)} section chunks")
     logger.info(f"Built {len(text_chunks)} text chunks")
     
     return all_sections, text_chunks
 
-def build_index(text_chunks: list[dict], embedder: Embedder) -> None:
+def build_index(
+    text_chunks: list[dict],
+    embedder: Embedder,
+    batch_size: int = INGEST_BATCH_SIZE
+) -> tuple[Optional[faiss.Index], list[dict]]:
     """
     Build FAISS index from text chunks.
     
@@ -209,7 +608,14 @@ def build_index(text_chunks: list[dict], embedder: Embedder) -> None:
     Args:
         text_chunks: List of chunk dictionaries with 'text' key
         embedder: Embedder instance
+        batch_size: Texts per embedding batch (all texts are embedded in one call)
+        
+    Returns:
+        Tuple of (index, metadata) now being served, or (None, []) if
+        embedding failed. The files on disk are only for the next cold start.
     """
+    global _index_mtimes
+    
     logger.info("Building FAISS index...")
     
     texts = [chunk["text"] for chunk in text_chunks]
@@ -217,26 +623,10 @@ def build_index(text_chunks: list[dict], embedder: Embedder) -> None:
     metadatas = []
     for chunk in text_chunks:
         raw_fields = chunk["fields"]
-        decoded_flat = {}
-        
-        if isinstance(raw_fields, dict):
-            for field_name, value in raw_fields.items():
-                if value not in [None, "", [], {}, -1, "-1"]:
-                    decoded_flat[field_name] = decode_field(field_name, str(value))
-                else:
-                    decoded_flat[field_name] = str(value) if value is not None else ""
-        
-        elif isinstance(raw_fields, list):
-            for item in raw_fields:
-                if isinstance(item, dict):
-                    for field_name, value in item.items():
-                        if value not in [None, "", [], {}, -1, "-1"]:
-                            decoded_flat[field_name] = decode_field(field_name, str(value))
-                        else:
-                            decoded_flat[field_name] = str(value) if value is not None else ""
-        
-        decoded_flat["risk_location"] = str(chunk["metadata"].get("risk_location", ""))
-        decoded_flat["user_name"] = str(chunk["metadata"].get("user_name", ""))
+        # Decoded in the ingestion workers; chunks from elsewhere are decoded here
+        decoded_flat = chunk.get("decoded_fields")
+        if decoded_flat is None:
+            decoded_flat = _decode_chunk_fields(raw_fields, chunk["metadata"])
         
         metadatas.append({
             "quote_id": chunk["quote_id"],
@@ -247,86 +637,207 @@ def build_index(text_chunks: list[dict], embedder: Embedder) -> None:
             **chunk["metadata"]
         })
     
-    vectors = embedder.embed_with_retry(texts)
+    embed_cache = EmbeddingCache(embedder.cache_namespace, EMBED_CACHE_PATH)
+    try:
+        vectors = embed_cache.embed(
+            texts, lambda missing: embedder.embed_corpus(missing, batch_size=batch_size)
+        )
+    except RuntimeError as e:
+        # Some batches failed: an index missing those chunks would misalign
+        # FAISS ids with the metadata
+        logger.error(f"Failed to embed the corpus: {e}")
+        return None, []
     
     if len(vectors) == 0:
         logger.error("Failed to generate any embeddings")
-        return
+        return None, []
     
     dim = vectors.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(np.array(vectors).astype("float32"))
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    
+    # Embedder output is already L2-normalized: inner product = cosine
+    # similarity, no faiss.normalize_L2 pass needed
+    index_type = resolve_index_type(FAISS_INDEX_TYPE, len(vectors))
+    index = create_index(dim, index_type, len(vectors))
+    if FAISS_INDEX_REFINE and index_type != "flat":
+        index = with_refine(index)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
     
     os.makedirs("index", exist_ok=True)
     faiss.write_index(index, INDEX_PATH)
     
-    with open(METADATA_PATH, "wb") as f:
-        pickle.dump(metadatas, f)
+    save_metadata(METADATA_PATH, metadatas)
     
-    logger.info(f"Index built: {len(vectors)} vectors, {dim} dimensions")
+    # Serve the in-memory objects directly; no read-back of what was just written
+    with _index_lock:
+        _install_index(index, metadatas)
+        _index_mtimes = _index_file_mtimes()
+    
+    logger.info(f"Index built ({index_type}): {len(vectors)} vectors, {dim} dimensions")
+    
+    return index, metadatas
 
 def retrieve_chunks_with_threshold(
     query: str,
     embedder: Embedder,
     threshold: float = CHUNK_SIMILARITY_THRESHOLD,
     top_k: int = TOP_K_CHUNKS,
-    quote_id_filter: Optional[str] = None
+    quote_id_filter: Optional[str] = None,
+    query_vector: Optional[np.ndarray] = None
 ) -> tuple[list[dict], float]:
     """
     Retrieve chunks above similarity threshold.
     
+    Results are cached: a repeated or near-duplicate question (same quote
+    ID filter) is answered without embedding or searching again.
+    
     Args:
         query: User's question
         embedder: Embedder instance
         threshold: Minimum cosine similarity
         top_k: Maximum chunks to retrieve
         quote_id_filter: Optional quote ID to filter by
+        query_vector: Precomputed query embedding (skips re-embedding the query)
         
     Returns:
         Tuple of (filtered_chunks, top_similarity_score)
     """
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(METADATA_PATH):
+    index, metadata, meta_index, searcher = load_index_snapshot()
+    if index is None:
         logger.warning("Index not found")
         return [], 0.0
     
-    index = faiss.read_index(INDEX_PATH)
+    scope = (quote_id_filter, threshold, top_k)
+    cache_key = (normalize_query(query),) + scope
+    cached = _retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    if query_vector is None:
+        query_vector = embedder.embed_single(query)
+    
+    cached = _retrieval_cache.get_similar(query_vector, scope=scope)
+    if cached is not None:
+        return cached
+    
+    if quote_id_filter:
+        # FAISS ids are metadata positions: scan only this proposal's chunks
+        chunk_ids = meta_index.chunk_indices.get(quote_id_filter)
+        if not chunk_ids:
+            return [], 0.0
+        # Exhaustive over the subset for every index type (HNSW included);
+        # the similarity threshold is applied inside the search as well
+        scores, indices = subset_search(
+            index, query_vector, chunk_ids, threshold, min(top_k, len(chunk_ids))
+        )
+    else:
+        scores, indices = searcher.search(query_vector, top_k * 2)
     
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
+    # Any quote_id filter was already applied inside the FAISS search
+    result = _select_chunks(scores[0], indices[0], metadata, threshold, top_k)
+    _retrieval_cache.put(cache_key, query_vector, result, scope=scope)
+    return result
+
+def _select_chunks(
+    scores: np.ndarray,
+    indices: np.ndarray,
+    metadata: list[dict],
+    threshold: float,
+    top_k: int
+) -> tuple[list[dict], float]:
+    """
+    Apply threshold + top-k to one row of FAISS results in one vectorized pass.
     
-    query_vector = embedder.embed_single(query)
+    Returns:
+        Tuple of (chunk copies with a "score" key, top_similarity_score)
+    """
+    valid = indices != -1  # -1 marks an empty result slot
+    top_similarity = float(scores[valid].max(initial=0.0))
+    keep = np.flatnonzero(valid & (scores >= threshold))[:top_k]
+    
+    # Copy so the shared metadata chunks are never mutated
+    results = [
+        {**metadata[indices[i]], "score": float(scores[i])}
+        for i in keep
+    ]
     
-    scores, indices = index.search(
-        np.array([query_vector]).astype("float32"),
-        top_k * 2
-    )
+    return results, top_similarity
+
+def retrieve_chunks_batch(
+    queries: list[str],
+    embedder: Embedder,
+    threshold: float = CHUNK_SIMILARITY_THRESHOLD,
+    top_k: int = TOP_K_CHUNKS,
+    query_vectors: Optional[np.ndarray] = None
+) -> list[tuple[list[dict], float]]:
+    """
+    Retrieve chunks for many queries with one embedding call and one search.
     
-    results = []
-    top_similarity = 0.0
+    The (B, d) query matrix goes to FAISS in a single index.search, which
+    parallelises across queries. No quote_id filtering: use
+    retrieve_chunks_with_threshold for proposal-scoped queries.
     
-    for score, idx in zip(scores[0], indices[0]):
-        if idx == -1:
-            continue
-            
-        if score > top_similarity:
-            top_similarity = float(score)
-        
-        if score < threshold:
-            continue
-        
-        chunk = metadata[idx]
-        
-        if quote_id_filter:
-            if chunk.get("quote_id") != quote_id_filter:
-                continue
-        
-        chunk["score"] = float(score)
-        results.append(chunk)
+    Args:
+        queries: User questions
+        embedder: Embedder instance
+        threshold: Minimum cosine similarity
+        top_k: Maximum chunks per query
+        query_vectors: Precomputed (B, d) embeddings of the queries
         
-        if len(results) >= top_k:
-            break
+    Returns:
+        One (filtered_chunks, top_similarity_score) tuple per query
+    """
+    index, metadata, _, _ = load_index_snapshot()
+    if index is None or not queries:
+        return [([], 0.0) for _ in queries]
     
-    return results, top_similarity
+    if query_vectors is None:
+        query_vectors = embedder.embed_texts(queries, show_progress=False)
+    query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    
+    k = top_k * 2
+    scores, indices = index.search(query_vectors, k, params=search_params(index, k))
+    
+    return [
+        _select_chunks(scores[row], indices[row], metadata, threshold, top_k)
+        for row in range(len(queries))
+    ]
+
+def prefetch_retrieval(queries: list[str], embedder: Embedder) -> list[Optional[np.ndarray]]:
+    """
+    Embed and search the sub-questions of a multi-part question together.
+    
+    Sub-questions without a quote ID are embedded in one call and searched
+    with one retrieve_chunks_batch call; the results are stored in the
+    retrieval cache under the key retrieve_chunks_with_threshold looks up,
+    so handle_query finds them instead of searching again. Quote-ID
+    sub-questions are left out: their retrieval is proposal-scoped, and
+    most are answered without embedding at all.
+    
+    Args:
+        queries: Sub-questions, answered afterwards by handle_query
+        embedder: Embedder instance
+        
+    Returns:
+        Per query, its embedding (to pass to handle_query as query_vector),
+        or None for quote-ID sub-questions
+    """
+    vectors: list[Optional[np.ndarray]] = [None] * len(queries)
+    positions = [i for i, query in enumerate(queries) if not extract_quote_id(query)]
+    if not positions:
+        return vectors
+    
+    batch = [queries[i].strip() for i in positions]
+    query_vectors = embedder.embed_texts(batch, show_progress=False)
+    results = retrieve_chunks_batch(batch, embedder, query_vectors=query_vectors)
+    
+    scope = (None, CHUNK_SIMILARITY_THRESHOLD, TOP_K_CHUNKS)
+    for i, query, vector, result in zip(positions, batch, query_vectors, results):
+        _retrieval_cache.put((normalize_query(query),) + scope, vector, result, scope=scope)
+        vectors[i] = vector
+    return vectors
 
 def score_field_match(field_name: str, query: str) -> int:
     """
@@ -339,68 +850,44 @@ def score_field_match(field_name: str, query: str) -> int:
     Returns:
         Number of significant words that overlap between field name and query
     """
-    normalized = field_name.replace("_label", "").replace("_", " ").lower()
-    field_words = set(normalized.split())
-    query_words = set(query.lower().split())
-    
-    noise = {"does", "is", "the", "a", "an", "for", "of", "in",
-             "what", "which", "how", "many", "have", "has", "this",
-             "with", "do", "you"}
-    field_words -= noise
-    query_words -= noise
-    
-    return len(field_words & query_words)
+    return len(field_tokens(field_name) & query_tokens(query))
 
-def structured_lookup(query: str) -> Optional[str]:
+def structured_lookup(
+    query: str,
+    quote_id: Optional[str] = None,
+    query_lower: Optional[str] = None
+) -> Optional[str]:
     """
     Perform deterministic lookup for a specific field of a specific record.
     Uses scored word matching to find the best field match without embeddings.
     
     Args:
         query: User's question
+        quote_id: Quote ID already extracted from the query (extracted here if None)
+        query_lower: query.lower(), if the caller already has it
         
     Returns:
         Formatted answer string if found, else None
     """
-    quote_id = extract_quote_id(query)
+    quote_id = quote_id or extract_quote_id(query)
     if not quote_id:
         return None
     
-    if not os.path.exists(METADATA_PATH):
+    meta_index = load_metadata_index()
+    if meta_index is None:
         return None
     
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
-    
-    query_lower = query.lower()
+    query_lower = query_lower or query.lower()
     
     # Handle location queries specially
-    location_keywords = ["location", "address", "where", "located", "risk location", "city", "state"]
-    if any(kw in query_lower for kw in location_keywords):
-        for chunk in metadata:
-            if chunk.get("quote_id") != quote_id:
-                continue
+    if _LOCATION_QUESTION_RE.search(query_lower):
+        for chunk in meta_index.chunks_for(quote_id):
             risk_location = chunk.get("risk_location")
             if risk_location and isinstance(risk_location, str) and risk_location.strip():
                 return f"Risk Location for {quote_id}: {risk_location}"
     
-    best_match = None
-    
-    for chunk in metadata:
-        if chunk.get("quote_id") != quote_id:
-            continue
-        
-        search_fields = chunk.get("decoded_fields") or chunk.get("fields", {})
-        
-        if not isinstance(search_fields, dict):
-            continue
-        
-        for field_name, value in search_fields.items():
-            score = score_field_match(field_name, query)
-            
-            if score > 0:
-                if best_match is None or score > best_match[0]:
-                    best_match = (score, field_name, value)
+    # Field-name tokens are precomputed per quote as integer ids
+    best_match = meta_index.best_field(quote_id, query_tokens(query), decoded=True)
     
     if best_match and best_match[0] >= 2:
         field_name = best_match[1]
@@ -415,108 +902,73 @@ def structured_lookup(query: str) -> Optional[str]:
                                 
                                                                
 
-def search_proposals_by_value(query: str) -> Optional[str]:
+def search_proposals_by_value(query: str, query_lower: Optional[str] = None) -> Optional[str]:
     """
     Search across all proposals for matching values in metadata.
     Handles queries like "businesses in Penang", "proposals with CCTV", etc.
     
     Args:
         query: User's question
+        query_lower: query.lower(), if the caller already has it
         
     Returns:
         Formatted answer string with matching results, or None
     """
-    if not os.path.exists(METADATA_PATH):
+    meta_index = load_metadata_index()
+    if meta_index is None or not len(meta_index):
         return None
     
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
-    
-    query_lower = query.lower()
+    query_lower = query_lower or query.lower()
     results = []
     seen_quotes = set()
     
                                                                     
     
                            
-    state_city_names = ["penang", "johor", "selangor", "kuala lumpur", "kedah", "perak", 
-                        "sabah", "sarawak", "melaka", "pahang", "kelantan", "terengganu",
-                        "negeri sembilan", "perlis", "putrajaya", "labuan", "johor bahru",
-                        "george town", "ipoh", "kuching", "kota kinabalu", "alor setar",
-                        "shah alam", "petaling jaya", "subang", "klang", "cyberjaya",
-                        "muar", "batu pahat", "larkin", "senai"]
-    
-                                 
-    business_types = ["pawn", "pawn shop", "pawnshop", "pawnbroker", "money changer", 
-                      "money exchange", "forex", "fx exchange", "exchange", "jeweller",
-                      "goldsmith", "gold", "jewelry", "jewellery"]
-    
-                                       
-    target_location = None
-    for location in state_city_names:
-        if location in query_lower:
-            target_location = location
-            break
+    target_location = _first_keyword(_LOCATION_RE, LOCATION_NAMES, query_lower)
+    target_business_type = _first_keyword(_BUSINESS_TYPE_RE, BUSINESS_TYPES, query_lower)
     
-                                            
-    target_business_type = None
-    for btype in business_types:
-        if btype in query_lower:
-            target_business_type = btype
-            break
-    
-                                              
     looking_for_business = any(w in query_lower for w in ["business", "company", "name", "who", "which"])
     looking_for_count = any(w in query_lower for w in ["how many", "count", "number of"])
     looking_for_list = any(w in query_lower for w in ["list", "show", "all", "give"])
     
                      
-    for chunk in metadata:
-        quote_id = chunk.get("quote_id")
-        if not quote_id or quote_id in seen_quotes:
+    # Chunk-level match masks over the whole corpus, kept per keyword by the
+    # index; only matching chunks are visited below (first match per
+    # proposal, in metadata order)
+    n_chunks = len(meta_index)
+    location_hits = np.zeros(n_chunks, dtype=bool)
+    business_hits = np.zeros(n_chunks, dtype=bool)
+    if target_location:
+        location_hits = meta_index.keyword_mask("risk_location_lower", target_location)
+    if target_business_type:
+        business_hits = (
+            meta_index.keyword_mask("nature_of_business_lower", target_business_type)
+            | meta_index.keyword_mask("business_name_lower", target_business_type)
+        )
+    
+    for i in np.flatnonzero((location_hits | business_hits) & (meta_index.quote_codes >= 0)):
+        chunk = meta_index.metadata[i]
+        quote_id = chunk["quote_id"]
+        if quote_id in seen_quotes:
             continue
+        seen_quotes.add(quote_id)
         
         risk_location = chunk.get("risk_location", "")
-        fields = chunk.get("fields", {})
+        business_name = meta_index.business_names[i]
+        nature_of_business = meta_index.natures_of_business[i]
         
-                              
-        business_name = None
-        nature_of_business = None
-        if isinstance(fields, dict):
-            for fn, fv in fields.items():
-                fn_lower = fn.lower()
-                if "business_name" in fn_lower and not business_name:
-                    business_name = fv
-                elif "nature_of_business" in fn_lower and not nature_of_business:
-                    nature_of_business = fv
-        
-                               
-        if target_location:
-            if isinstance(risk_location, str) and target_location in risk_location.lower():
-                seen_quotes.add(quote_id)
-                
-                if looking_for_business and business_name:
-                    results.append(f"{business_name} ({quote_id}) - {risk_location}")
-                else:
-                    results.append(f"{quote_id}: {risk_location}")
-                continue
-        
-                              
-        if target_business_type:
-            nature_str = str(nature_of_business).lower() if nature_of_business else ""
-            name_str = str(business_name).lower() if business_name else ""
-            
-            if target_business_type in nature_str or target_business_type in name_str:
-                seen_quotes.add(quote_id)
-                
-                if looking_for_business and business_name:
-                    rl_short = risk_location[:50] + "..." if len(risk_location) > 50 else risk_location
-                    results.append(f"{business_name} ({quote_id}) - {rl_short}")
-                else:
-                    results.append(f"{quote_id}: {nature_of_business or 'N/A'}")
-                continue
+        if location_hits[i]:
+            if looking_for_business and business_name:
+                results.append(f"{business_name} ({quote_id}) - {risk_location}")
+            else:
+                results.append(f"{quote_id}: {risk_location}")
+        elif looking_for_business and business_name:
+            rl_short = risk_location[:50] + "..." if len(risk_location) > 50 else risk_location
+            results.append(f"{business_name} ({quote_id}) - {rl_short}")
+        else:
+            results.append(f"{quote_id}: {nature_of_business or 'N/A'}")
     
-                     
     if results:
         if looking_for_count:
             if target_location:
@@ -544,13 +996,14 @@ def search_proposals_by_value(query: str) -> Optional[str]:
     
     return None
 
-def analytical_query_handler(query: str) -> Optional[str]:
+def analytical_query_handler(query: str, query_lower: Optional[str] = None) -> Optional[str]:
     """
     Handle analytical queries that aggregate data across all proposals.
     ONLY handles queries that don't mention specific locations or business types.
     
     Args:
         query: User's question
+        query_lower: query.lower(), if the caller already has it
         
     Returns:
         Answer string if this is an analytical query, else None
@@ -558,31 +1011,18 @@ def analytical_query_handler(query: str) -> Optional[str]:
     if not os.path.exists(METADATA_PATH):
         return None
     
-    query_lower = query.lower()
+    query_lower = query_lower or query.lower()
     
                                                                                         
-    location_names = ["penang", "johor", "selangor", "kuala lumpur", "kedah", "perak", 
-                      "sabah", "sarawak", "melaka", "pahang", "kelantan", "terengganu",
-                      "negeri sembilan", "perlis", "putrajaya", "labuan", "johor bahru",
-                      "george town", "ipoh", "kuching", "kota kinabalu", "muar"]
-    if any(loc in query_lower for loc in location_names):
+    if _ANALYTICAL_EXCLUDED_RE.search(query_lower):
         return None
     
-                                                                                     
-    business_types = ["pawn", "pawnshop", "money changer", "forex", "exchange", "jeweller", "goldsmith"]
-    if any(bt in query_lower for bt in business_types):
+    meta_index = load_metadata_index()
+    if meta_index is None or not len(meta_index):
         return None
     
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
-    
-    query_lower = query.lower()
-    
                    
     if "how many" in query_lower:
-        yes_values = {"001", "yes", "true", "1"}
-        counted_quotes = set()
-        
                                                 
         field_patterns = []
         
@@ -604,41 +1044,18 @@ def analytical_query_handler(query: str) -> Optional[str]:
             field_patterns = ["safe", "certified"]
         elif "proposal" in query_lower or "record" in query_lower:
                                           
-            for chunk in metadata:
-                qid = chunk.get("quote_id")
-                if qid:
-                    counted_quotes.add(qid)
-            return f"There are {len(counted_quotes)} proposal records in the system."
+            return f"There are {len(meta_index.quote_ids)} proposal records in the system."
         
         if field_patterns:
-            for chunk in metadata:
-                quote_id = chunk.get("quote_id")
-                if not quote_id or quote_id in counted_quotes:
-                    continue
-                
-                fields = chunk.get("fields", {})
-                if not isinstance(fields, dict):
-                    continue
-                
-                for field_name, value in fields.items():
-                    field_lower = field_name.lower()
-                    if any(p in field_lower for p in field_patterns):
-                        if str(value).lower().strip() in yes_values:
-                            counted_quotes.add(quote_id)
-                            break
-            
-            return f"{len(counted_quotes)} proposals have this feature."
+            # Proposals with a "Yes" in any matching field, counted on the
+            # (proposal x field) boolean matrix built once per metadata load
+            return f"{meta_index.count_yes(field_patterns)} proposals have this feature."
     
                   
     if any(w in query_lower for w in ["list all", "show all", "what are all", "give all"]):
                             
         if "proposal" in query_lower or "quote" in query_lower:
-            quote_ids = set()
-            for chunk in metadata:
-                qid = chunk.get("quote_id")
-                if qid:
-                    quote_ids.add(qid)
-            return "Proposals in system:\n" + "\n".join(f"- {qid}" for qid in sorted(quote_ids))
+            return "Proposals in system:\n" + "\n".join(f"- {qid}" for qid in sorted(meta_index.quote_ids))
     
     return None
 
@@ -652,7 +1069,9 @@ def handle_query(
     llm: LLMClient,
     qa_store: PredefinedQAStore,
     analytical_engine: AnalyticalEngine,
-    query_parser: Optional[QueryParser] = None
+    query_parser: Optional[QueryParser] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    query_vector: Optional[np.ndarray] = None
 ) -> str:
     """
     Main query handler implementing all patterns with LLM-assisted query understanding.
@@ -669,22 +1088,26 @@ def handle_query(
         qa_store: Predefined QA store
         analytical_engine: Pandas-based analytical engine
         query_parser: Persistent query parser with conversation history
+        on_token: Called with each piece of a generated (semantic) answer as
+            the LLM streams it, before the full answer is returned
+        query_vector: Precomputed embedding of the query (see
+            prefetch_retrieval), used instead of embedding it here
         
     Returns:
         Answer string
     """
-    global _scope_classifier, _partial_engine, _compound_handler
+    global _scope_classifier, _partial_engine, _compound_handler, _handler_metadata
     query = query.strip()
 
     # Scope pre-check (before embedding or LLM call)
     if _scope_classifier is None:
         _scope_classifier = QueryClassifier()
-    if _partial_engine is None:
-        _partial_engine = PartialAnswerEngine(METADATA_PATH)
-    if _compound_handler is None:
-        with open(METADATA_PATH, "rb") as f:
-            _meta = pickle.load(f)
+    _, _meta = load_index()
+    if _partial_engine is None or (_meta and _meta is not _handler_metadata):
+        # Share the served metadata list; rebuild after a reload or rebuild
+        _partial_engine = PartialAnswerEngine(METADATA_PATH, metadata=_meta or None)
         _compound_handler = CompoundQueryHandler(_meta)
+        _handler_metadata = _meta
 
     scope = _scope_classifier.classify(query)
 
@@ -725,13 +1148,34 @@ def handle_query(
             query_parser.add_raw_to_history(query, answer)
         return clean_output(answer)
 
-    # Main pipeline for answerable queries
+    # Main pipeline for answerable queries; the quote ID and lowercase
+    # query are computed once and handed to the deterministic handlers
     quote_id = extract_quote_id(query)
+    query_lower = query.lower()
 
-    query_embedding = embedder.embed_single(query)
-    predefined_answer = qa_store.find_match(query_embedding, PREDEFINED_SIMILARITY_THRESHOLD)
+    # Predefined Q&A are general questions that never name a proposal, so a
+    # query with a quote ID skips that match and is only embedded if it
+    # reaches semantic retrieval (deterministic handlers answer most of them)
+    query_embedding = query_vector
+    predefined_answer = None
+    parse_future: Optional[Future] = None
+    if not quote_id:
+        # A predefined question asked verbatim is answered without embedding
+        predefined_answer = qa_store.find_exact(query)
+        if predefined_answer is None:
+            if _parse_pool is not None:
+                if query_parser is None:
+                    query_parser = QueryParser(llm)
+                parse_future = _parse_pool.submit(query_parser.parse, query)
+            if query_embedding is None:
+                query_embedding = embedder.embed_single(query)
+            predefined_answer = qa_store.find_match(query_embedding, PREDEFINED_SIMILARITY_THRESHOLD)
     
     if predefined_answer:
+        if parse_future is not None:
+            # Drops a parse still queued; one already calling the LLM is
+            # left to finish and its result ignored
+            parse_future.cancel()
         logger.info("Matched predefined Q&A")
         log_query(query, "predefined", quote_id, 0, PREDEFINED_SIMILARITY_THRESHOLD, predefined_answer)
         if query_parser:
@@ -742,9 +1186,9 @@ def handle_query(
     
     if query_parser is None:
         query_parser = QueryParser(llm)
-    query_executor = SmartQueryExecutor(METADATA_PATH)
+    query_executor = get_query_executor()
     
-    parsed = query_parser.parse(query)
+    parsed = parse_future.result() if parse_future is not None else query_parser.parse(query)
     logger.info(f"Parsed query - Intent: {parsed.intent}, Fields: {parsed.target_fields}, Filter: {parsed.filter_field}={parsed.filter_value}, Contains: {parsed.filter_contains}")
     
     if parsed.intent == "out_of_scope":
@@ -776,11 +1220,11 @@ def handle_query(
     
     logger.info("Smart executor could not handle, trying fallback handlers")
     
-    query_type = classify_query(query)
+    query_type = classify_query(query, quote_id)
     logger.info(f"Query classified as: {query_type}")
     
     if query_type == "analytical":
-        analytical_result = analytical_query_handler(query)
+        analytical_result = analytical_query_handler(query, query_lower)
         if analytical_result:
             logger.info("Handled by analytical query handler (specific)")
             log_query(query, "analytical_specific", quote_id, 0, 1.0, analytical_result)
@@ -804,7 +1248,7 @@ def handle_query(
                                                               
                                                  
                                                  
-    structured_result = structured_lookup(query)
+    structured_result = structured_lookup(query, quote_id, query_lower) if quote_id else None
     if structured_result:
         logger.info("Handled by structured lookup (deterministic)")
         log_query(query, "structured", quote_id, 0, 1.0, structured_result)
@@ -816,7 +1260,7 @@ def handle_query(
                                                             
                                                                    
                                                  
-    cross_search_result = search_proposals_by_value(query)
+    cross_search_result = search_proposals_by_value(query, query_lower)
     if cross_search_result:
         logger.info("Handled by cross-proposal value search")
         log_query(query, "cross_search", quote_id, 0, 1.0, cross_search_result)
@@ -827,12 +1271,16 @@ def handle_query(
                                                  
                                            
                                                  
+    if query_embedding is None:
+        logger.debug("Embedding the quote-ID query for semantic retrieval")
+    
     chunks, top_similarity = retrieve_chunks_with_threshold(
         query,
         embedder,
         threshold=CHUNK_SIMILARITY_THRESHOLD,
         top_k=TOP_K_CHUNKS,
-        quote_id_filter=quote_id
+        quote_id_filter=quote_id,
+        query_vector=query_embedding
     )
     
                                                  
@@ -848,13 +1296,7 @@ def handle_query(
                                                                   
                                                  
                                             
-    history_context = ""
-    if query_parser and query_parser.conversation_history:
-        history_lines = ["Previous conversation:"]
-        for turn in query_parser.conversation_history[-3:]:
-            history_lines.append(f"User: {turn['query']}")
-            history_lines.append(f"Assistant: {turn['answer_preview']}")
-        history_context = "\n".join(history_lines) + "\n\n"
+    history_context = query_parser.recent_history_text() if query_parser else ""
     
     prompt = build_prompt(
         context=history_context + "\n\n".join([c["text"] for c in chunks]),
@@ -865,7 +1307,14 @@ def handle_query(
                              
                                                  
     try:
-        raw_answer = llm.generate(prompt)
+        if on_token is None:
+            raw_answer = llm.generate(prompt)
+        else:
+            pieces = []
+            for piece in llm.stream(prompt):
+                pieces.append(piece)
+                on_token(piece)
+            raw_answer = "".join(pieces)
         answer = clean_output(raw_answer)                                  
     except Exception as e:
         logger.error(f"LLM generation failed: {e}")
@@ -897,20 +1346,22 @@ def initialize_system() -> tuple[Embedder, LLMClient, PredefinedQAStore, Analyti
     logger.info(f"Embedder initialized: {embedder.embedding_dim} dimensions")
     
                                                  
+    metadata = None
     if not os.path.exists(INDEX_PATH) or not os.path.exists(METADATA_PATH):
         logger.info("Index not found, running ingestion...")
         _, text_chunks = run_ingestion()
-        build_index(text_chunks, embedder)
+        # A fresh build is served from memory, not read back from disk
+        _, metadata = build_index(text_chunks, embedder)
     
                                          
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
+    if not metadata:
+        _, metadata = load_index()
     
                                                  
     qa_store = PredefinedQAStore()
     qa_store.load_from_file(PREDEFINED_QA_PATH)
     if qa_store.is_loaded:
-        qa_store.embed_all(embedder)
+        qa_store.embed_all(embedder, EmbeddingCache(embedder.cache_namespace, EMBED_CACHE_PATH))
         logger.info(f"Predefined Q&A loaded: {len(qa_store)} pairs")
     
                            
@@ -927,6 +1378,44 @@ def initialize_system() -> tuple[Embedder, LLMClient, PredefinedQAStore, Analyti
                   
                                                                
 
+class _StreamPrinter:
+    """
+    on_token callback for the CLI: prints a streamed answer paragraph by
+    paragraph, each cleaned as it completes.
+    """
+    
+    def __init__(self):
+        self.started = False
+        self._paragraphs: list[str] = []  # cleaned paragraphs printed so far
+        self._buffer = ""
+    
+    def __call__(self, piece: str) -> None:
+        if not self.started:
+            print("\n=== ANSWER ===\n")
+            self.started = True
+        *paragraphs, self._buffer = (self._buffer + piece).split("\n\n")
+        for paragraph in paragraphs:
+            self._print(paragraph)
+    
+    def finish(self) -> None:
+        """Print whatever follows the last paragraph break."""
+        self._print(self._buffer)
+        self._buffer = ""
+    
+    @property
+    def printed(self) -> str:
+        """The text shown so far, as clean_output would format it."""
+        return "\n\n".join(self._paragraphs)
+    
+    def _print(self, paragraph: str) -> None:
+        cleaned = clean_fragment(paragraph)
+        if not cleaned:
+            return
+        if self._paragraphs:
+            print()  # blank line between paragraphs
+        print(cleaned, flush=True)
+        self._paragraphs.append(cleaned)
+
 def main():
     """Main entry point for the interactive system."""
     
@@ -954,11 +1443,11 @@ def main():
                 global _compound_handler, _partial_engine
                 print("Rebuilding index...")
                 _, text_chunks = run_ingestion()
-                build_index(text_chunks, embedder)
-                
-                                 
-                with open(METADATA_PATH, "rb") as f:
-                    metadata = pickle.load(f)
+                _, new_metadata = build_index(text_chunks, embedder)
+                if not new_metadata:
+                    print("Rebuild failed; keeping the current index.")
+                    continue
+                metadata = new_metadata
                 analytical_engine = AnalyticalEngine(metadata=metadata)
                 # Reset lazy singletons so they reload fresh metadata
                 _partial_engine = None
@@ -972,12 +1461,28 @@ def main():
             if len(questions) > 1:
                 # Multi-question: answer each, aggregate
                 answers = []
-                for i, sub_q in enumerate(questions, 1):
-                    sub_answer = handle_query(sub_q, embedder, llm, qa_store, analytical_engine, query_parser)
+                query_vectors = prefetch_retrieval(questions, embedder)
+                for i, (sub_q, sub_vector) in enumerate(zip(questions, query_vectors), 1):
+                    sub_answer = handle_query(
+                        sub_q, embedder, llm, qa_store, analytical_engine, query_parser,
+                        query_vector=sub_vector
+                    )
                     answers.append(f"Q{i}: {sub_q}\n{sub_answer}")
                 answer = "\n\n".join(answers)
             else:
-                answer = handle_query(query, embedder, llm, qa_store, analytical_engine, query_parser)
+                # Generated answers are printed while the LLM streams them
+                printer = _StreamPrinter()
+                answer = handle_query(
+                    query, embedder, llm, qa_store, analytical_engine, query_parser,
+                    on_token=printer
+                )
+                if printer.started:
+                    printer.finish()
+                    if answer == printer.printed:
+                        continue
+                    # Cleaning the whole answer gave different text (e.g. a code
+                    # block spanning paragraphs), or generation failed part-way:
+                    # show the answer actually returned and logged
             
             print("\n=== ANSWER ===\n")
             print(answer)
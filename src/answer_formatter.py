@@ -27,7 +27,7 @@ from __future__ import annotations
 
 from src.llm_client import LLMClient
 from src.query_parser import ParsedQuery
-from src.query_executor import QueryResult
+from src.query_executor import QueryResult, _field_key
 from src.query_classifier import QueryClassification
 
 FORMAT_PROMPT = """You are formatting a database query result into a natural language answer.
@@ -57,15 +57,12 @@ _EMPTY_SENTINELS = {None, "", "None", "nan", "-1", "N/A"}
 
 def _field_match_score(requested: str, actual: str) -> int:
     """Score how well *requested* field name matches *actual* field name."""
-    req = requested.lower().replace("_label", "").replace("_", " ")
-    act = actual.lower().replace("_label", "").replace("_", " ")
+    req, req_words = _field_key(requested)
+    act, act_words = _field_key(actual)
     if req == act:
         return 100
     if req in act or act in req:
         return 50 + len(min(req, act, key=len))
-    noise = {"the", "a", "an", "of", "in", "for", "is", "do", "you", "label"}
-    req_words = set(req.split()) - noise
-    act_words = set(act.split()) - noise
     if not req_words:
         return 0
     overlap = len(req_words & act_words)
@@ -18,6 +18,8 @@ from __future__ import annotations
 import re
 from typing import List, Dict, Optional, Tuple
 
+import numpy as np
+
 class CompoundQueryHandler:
 
     # Maps natural language phrases to (section, field_name) tuples.
@@ -119,17 +121,26 @@ class CompoundQueryHandler:
         "seremban", "klang", "kuantan",
         "kl",
     ]
+    # All known locations in one pass; the lookahead reports overlapping
+    # matches so the earliest-listed name found can still win
+    _LOCATION_RE = re.compile("(?=(" + "|".join(map(re.escape, _LOCATION_NAMES)) + "))")
 
     # Sentinel values treated as empty
-    _EMPTY = {"", "None", "null", "nan", "-1", "N/A", "n/a"}
+    _EMPTY = frozenset({"", "None", "null", "nan", "-1", "N/A", "n/a"})
 
     # Decoded values that mean "Yes"
-    _YES_VALS = {"yes", "001", "true", "1"}
+    _YES_VALS = frozenset({"yes", "001", "true", "1"})
 
     def __init__(self, metadata: list) -> None:
         self.metadata = metadata
         # Build lookup maps at init time for O(1) access
         self._location_map = self._build_location_map()
+        # Sorted quote_ids and their lowercase locations, so a location
+        # filter is one vectorized substring search
+        self._location_qids = np.array(sorted(self._location_map), dtype=object)
+        self._locations_lower = np.array(
+            [self._location_map[qid].lower() for qid in self._location_qids], dtype=str
+        )
         self._field_map = self._build_field_map()
         self._name_map = self._build_name_map()
         self._value_map = self._build_value_map()
@@ -278,9 +289,9 @@ class CompoundQueryHandler:
             if loc:
                 return loc
         # Fallback: check known location names
-        for loc in self._LOCATION_NAMES:
-            if loc in q:
-                return loc
+        found = {m.group(1) for m in self._LOCATION_RE.finditer(q)}
+        if found:
+            return min(found, key=self._LOCATION_NAMES.index)
         return None
 
     def _extract_condition_filters(self, q: str) -> List[Tuple[str, str]]:
@@ -308,15 +319,14 @@ class CompoundQueryHandler:
     # Proposal filtering
     def _filter_by_location(self, location: str) -> List[str]:
         """Return quote_ids whose risk_location contains *location*."""
-        matched: List[str] = []
         loc_lower = location.lower()
         # "kl" is shorthand for Kuala Lumpur
         if loc_lower == "kl":
             loc_lower = "kuala lumpur"
-        for qid, loc in self._location_map.items():
-            if loc_lower in loc.lower():
-                matched.append(qid)
-        return sorted(matched)
+        if not self._location_qids.size:
+            return []
+        mask = np.char.find(self._locations_lower, loc_lower) >= 0
+        return self._location_qids[mask].tolist()
 
     def _filter_by_conditions(
         self,
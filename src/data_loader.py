@@ -1,5 +1,5 @@
 import pandas as pd
-import json
+from loader.json_cleaner import loads_json
 from .mappings import YES_NO_MAP, BUSINESS_TYPE_MAP
 from .validator import validate_sum_assured
 
@@ -14,7 +14,7 @@ def parse_json(cell):
     if isinstance(cell, dict):
         return cell
     try:
-        return json.loads(cell)
+        return loads_json(cell)
     except Exception:
         return {}
 
@@ -1,4 +1,6 @@
 import os
+from typing import Iterator
+
 from cerebras.cloud.sdk import Cerebras
 
 
@@ -10,13 +12,26 @@ class LLMClient:
             api_key=os.getenv("CEREBRAS_API_KEY")
         )
 
-    def generate(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
+    def _create(self, prompt: str, stream: bool):
+        """Chat completion request shared by generate() and stream()."""
+        return self.client.chat.completions.create(
             messages=[{"role": "user", "content": prompt}],
             model=self.model,
             max_completion_tokens=1024,
             temperature=0.1,
             top_p=1,
-            stream=False
+            stream=stream
         )
-        return response.choices[0].message.content
\ No newline at end of file
+
+    def generate(self, prompt: str) -> str:
+        response = self._create(prompt, stream=False)
+        return response.choices[0].message.content
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Generate like generate(), yielding text pieces as the model emits them."""
+        for chunk in self._create(prompt, stream=True):
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
@@ -1204,6 +1204,28 @@ def decode_field(field_name: str, value) -> str:
     result = mapping.get(value_str)
     return result if result is not None else value_str
 
+def _build_decode_lut() -> dict[str, dict[str, str]]:
+    """
+    Precompute decode_field() for every code each mapped field can take.
+
+    Keys are the codes as written in MAPPINGS plus their unpadded integer
+    form ("001" and "1"), so DECODE_LUT[field][code] == decode_field(field, code).
+    """
+    lut: dict[str, dict[str, str]] = {}
+    for field_name, mapping in MAPPINGS.items():
+        codes = set(mapping)
+        for code in mapping:
+            try:
+                codes.add(str(int(code)))
+            except ValueError:
+                pass
+        lut[field_name] = {code: decode_field(field_name, code) for code in codes}
+    return lut
+
+# field_name -> raw code string -> decoded label; codes not listed here
+# (free text, unknown codes, sentinels) still go through decode_field()
+DECODE_LUT: dict[str, dict[str, str]] = _build_decode_lut()
+
 def decode_all_fields(raw_fields: dict) -> dict:
     """
     Decode every key in *raw_fields* using decode_field().
@@ -0,0 +1,399 @@
+"""
+Metadata Index: hash-indexed views over the FAISS metadata chunk list.
+
+The metadata is a flat list of chunk dicts (one per proposal section).
+Lookups that only care about one proposal used to filter the whole list
+on every query; this index groups chunks by quote_id once at load time
+so a per-proposal lookup touches only that proposal's chunks.
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import mmap
+import pickle
+import sys
+from collections import defaultdict
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import orjson
+
+# Raw field values that mean "Yes"
+YES_VALUES = frozenset({"001", "yes", "true", "1"})
+
+# Field values up to this length are interned on load: coded answers
+# ("001", "Yes", ...) repeat across every proposal
+INTERN_MAX_LEN = 64
+
+# Separates values in the search-text column; never part of a search term
+SEARCH_TEXT_SEPARATOR = "\x00"
+
+# Words ignored when matching query words against field-name words
+NOISE_WORDS = frozenset({
+    "does", "is", "the", "a", "an", "for", "of", "in",
+    "what", "which", "how", "many", "have", "has", "this",
+    "with", "do", "you"
+})
+
+
+@functools.lru_cache(maxsize=None)
+def field_tokens(field_name: str) -> frozenset[str]:
+    """Significant words of a field name (e.g. "strong_room_label" -> {"strong", "room"})."""
+    normalized = field_name.replace("_label", "").replace("_", " ").lower()
+    return frozenset(normalized.split()) - NOISE_WORDS
+
+
+def query_tokens(query: str) -> frozenset[str]:
+    """Significant lowercase words of a query."""
+    return frozenset(query.lower().split()) - NOISE_WORDS
+
+
+def save_metadata(path: str, metadata: list[dict]) -> None:
+    """
+    Write the chunk metadata list.
+
+    A ".json" path is written with orjson (the default METADATA_PATH);
+    any other path is pickled with the newest protocol.
+    """
+    with open(path, "wb") as f:
+        if path.endswith(".json"):
+            f.write(orjson.dumps(metadata, default=str))
+        else:
+            pickle.dump(metadata, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_metadata(path: str) -> list[dict]:
+    """
+    Read the chunk metadata list written by save_metadata().
+
+    The file is memory-mapped and parsed straight from the mapping, so
+    its bytes are never copied into a separate read buffer. quote_id and
+    section strings repeat across chunks; they are interned so every chunk
+    of a proposal shares one string object. Short field values are interned
+    the same way, so each distinct value is held once rather than once per
+    chunk.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if path.endswith(".json"):
+            with memoryview(mapped) as view:
+                metadata = orjson.loads(view)
+        else:
+            metadata = pickle.loads(mapped)
+
+    for chunk in metadata:
+        for key in ("quote_id", "section"):
+            value = chunk.get(key)
+            if isinstance(value, str):
+                chunk[key] = sys.intern(value)
+        for key in ("fields", "decoded_fields"):
+            fields = chunk.get(key)
+            if isinstance(fields, dict):
+                for field_name, value in fields.items():
+                    if isinstance(value, str) and len(value) <= INTERN_MAX_LEN:
+                        fields[field_name] = sys.intern(value)
+
+    return metadata
+
+
+def dictionary_encode(values: Iterable[Optional[str]]) -> tuple[list[str], np.ndarray]:
+    """
+    Dictionary-encode a column of strings.
+
+    Returns:
+        (categories, codes) where categories[codes[i]] == values[i];
+        missing/empty values get code -1.
+    """
+    categories: list[str] = []
+    code_of: dict[str, int] = {}
+    codes = []
+    for value in values:
+        if not value:
+            codes.append(-1)
+            continue
+        code = code_of.get(value)
+        if code is None:
+            code = code_of[value] = len(categories)
+            categories.append(value)
+        codes.append(code)
+    return categories, np.array(codes, dtype=np.int32)
+
+
+def _business_fields(fields: Any) -> tuple[Any, Any]:
+    """First non-empty business_name / nature_of_business values of a chunk's raw fields."""
+    business_name = None
+    nature_of_business = None
+    if isinstance(fields, dict):
+        for field_name, value in fields.items():
+            name_lower = field_name.lower()
+            if "business_name" in name_lower and not business_name:
+                business_name = value
+            elif "nature_of_business" in name_lower and not nature_of_business:
+                nature_of_business = value
+    return business_name, nature_of_business
+
+
+def _token_csr(
+    fields: list[tuple[str, Any, frozenset[str]]],
+    vocab: dict[str, int]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Flatten the field-name tokens of one proposal into parallel int32 arrays.
+
+    Returns:
+        (token_ids, token_field): token_ids[i] is a token of field
+        token_field[i]; token ids are assigned from (and added to) vocab.
+    """
+    token_ids = []
+    token_field = []
+    for position, (_, _, tokens) in enumerate(fields):
+        for token in tokens:
+            token_ids.append(vocab.setdefault(token, len(vocab)))
+            token_field.append(position)
+    return np.array(token_ids, dtype=np.int32), np.array(token_field, dtype=np.int32)
+
+
+class MetadataIndex:
+    """Inverted index from quote_id to the chunks of that proposal."""
+
+    def __init__(self, metadata: list[dict]):
+        """
+        Build the index.
+
+        Args:
+            metadata: Chunk dicts as stored in index/metadata.json.
+        """
+        self.metadata = metadata
+
+        by_quote: dict[str, list[int]] = defaultdict(list)
+        for i, chunk in enumerate(metadata):
+            quote_id = chunk.get("quote_id")
+            if quote_id:
+                by_quote[quote_id].append(i)
+
+        # Chunk positions per quote_id, in metadata order
+        self.chunk_indices: dict[str, list[int]] = dict(by_quote)
+        self.by_quote: dict[str, list[dict]] = {
+            quote_id: [metadata[i] for i in indices]
+            for quote_id, indices in self.chunk_indices.items()
+        }
+        self.quote_ids: frozenset[str] = frozenset(self.by_quote)
+
+        # Dictionary-encoded quote column (one int32 code per chunk, in
+        # metadata order): a quote filter is a vector compare, not a string
+        # compare per chunk
+        self.quote_categories, self.quote_codes = dictionary_encode(
+            chunk.get("quote_id") for chunk in metadata
+        )
+        self._quote_code = {q: i for i, q in enumerate(self.quote_categories)}
+
+        # Per-chunk business columns, plus lowercase numpy copies so a
+        # substring filter over every chunk is one np.char.find call
+        business = [_business_fields(chunk.get("fields")) for chunk in metadata]
+        self.business_names: list[Any] = [name for name, _ in business]
+        self.natures_of_business: list[Any] = [nature for _, nature in business]
+        self.risk_location_lower = np.array([
+            location.lower() if isinstance(location, str) else ""
+            for location in (chunk.get("risk_location", "") for chunk in metadata)
+        ], dtype=str)
+        self.business_name_lower = np.array(
+            [str(name).lower() if name else "" for name in self.business_names], dtype=str
+        )
+        self.nature_of_business_lower = np.array(
+            [str(nature).lower() if nature else "" for nature in self.natures_of_business], dtype=str
+        )
+
+        # (field_name, raw value, field-name tokens) per quote, in chunk order
+        self.fields_by_quote: dict[str, list[tuple[str, Any, frozenset[str]]]] = {
+            quote_id: [
+                (field_name, value, field_tokens(field_name))
+                for chunk in chunks if isinstance(chunk.get("fields"), dict)
+                for field_name, value in chunk["fields"].items()
+            ]
+            for quote_id, chunks in self.by_quote.items()
+        }
+
+        # Same, but over each chunk's decoded (human-readable) field values,
+        # falling back to the raw fields for chunks built without them
+        self.decoded_fields_by_quote: dict[str, list[tuple[str, Any, frozenset[str]]]] = {
+            quote_id: [
+                (field_name, value, field_tokens(field_name))
+                for chunk in chunks
+                for fields in [chunk.get("decoded_fields") or chunk.get("fields", {})]
+                if isinstance(fields, dict)
+                for field_name, value in fields.items()
+            ]
+            for quote_id, chunks in self.by_quote.items()
+        }
+
+        # Field-name tokens as integer ids per proposal, so scoring every
+        # field against a query is one isin + bincount instead of a Python
+        # set intersection per field
+        self.token_vocab: dict[str, int] = {}
+        self._field_token_csr = {
+            quote_id: _token_csr(fields, self.token_vocab)
+            for quote_id, fields in self.fields_by_quote.items()
+        }
+        self._decoded_token_csr = {
+            quote_id: _token_csr(fields, self.token_vocab)
+            for quote_id, fields in self.decoded_fields_by_quote.items()
+        }
+
+        # Boolean feature matrix: yes_matrix[q, f] is True when proposal
+        # quote_order[q] has a "Yes" value for field field_names[f]
+        self.quote_order: list[str] = list(self.by_quote)
+        self.field_names: list[str] = sorted({
+            field_name
+            for fields in self.fields_by_quote.values()
+            for field_name, _, _ in fields
+        })
+        self._field_names_lower = [name.lower() for name in self.field_names]
+        column = {name: j for j, name in enumerate(self.field_names)}
+        self.yes_matrix = np.zeros((len(self.quote_order), len(self.field_names)), dtype=np.bool_)
+        for q, quote_id in enumerate(self.quote_order):
+            for field_name, value, _ in self.fields_by_quote[quote_id]:
+                if str(value).lower().strip() in YES_VALUES:
+                    self.yes_matrix[q, column[field_name]] = True
+        # keyword_mask() results per (column, keyword)
+        self._keyword_masks: dict[tuple[str, str], np.ndarray] = {}
+        # count_yes() results per pattern set: analytical queries reuse a
+        # handful of pattern sets and the matrix never changes
+        self._yes_counts: dict[tuple[str, ...], int] = {}
+
+    def columns_matching(self, patterns: Iterable[str]) -> np.ndarray:
+        """Column indices of fields whose lowercase name contains any pattern."""
+        patterns = tuple(patterns)
+        return np.array([
+            j for j, name in enumerate(self._field_names_lower)
+            if any(pattern in name for pattern in patterns)
+        ], dtype=np.intp)
+
+    def count_yes(self, patterns: Iterable[str]) -> int:
+        """Number of proposals with a "Yes" in any field matching the patterns."""
+        patterns = tuple(patterns)
+        count = self._yes_counts.get(patterns)
+        if count is None:
+            cols = self.columns_matching(patterns)
+            count = int(self.yes_matrix[:, cols].any(axis=1).sum()) if cols.size else 0
+            self._yes_counts[patterns] = count
+        return count
+
+    def quote_mask(self, quote_id: Optional[str]) -> np.ndarray:
+        """Boolean mask over metadata positions selecting one proposal's chunks."""
+        code = self._quote_code.get(quote_id, -2)  # -2 matches nothing
+        return self.quote_codes == code
+
+    @staticmethod
+    def contains(column: np.ndarray, needle: str) -> np.ndarray:
+        """Boolean mask of the rows of a lowercase string column containing needle."""
+        return np.char.find(column, needle) >= 0
+
+    def keyword_mask(self, column: str, keyword: str) -> np.ndarray:
+        """
+        Read-only contains() mask of a lowercase column attribute (e.g.
+        "risk_location_lower") for a keyword, computed once per pair.
+
+        Meant for a fixed keyword vocabulary (place names, business types):
+        after the first query naming a keyword, its chunks are a stored
+        posting list rather than a scan of the column.
+        """
+        key = (column, keyword)
+        mask = self._keyword_masks.get(key)
+        if mask is None:
+            mask = self.contains(getattr(self, column), keyword)
+            mask.flags.writeable = False
+            self._keyword_masks[key] = mask
+        return mask
+
+    def chunks_for(self, quote_id: Optional[str]) -> list[dict]:
+        """Return the chunks of one proposal (empty if unknown)."""
+        return self.by_quote.get(quote_id, [])
+
+    def fields_for(self, quote_id: Optional[str]) -> list[tuple[str, Any, frozenset[str]]]:
+        """Return (field_name, value, field tokens) for every dict field of a proposal."""
+        return self.fields_by_quote.get(quote_id, [])
+
+    def decoded_fields_for(self, quote_id: Optional[str]) -> list[tuple[str, Any, frozenset[str]]]:
+        """Return (field_name, decoded value, field tokens) for every field of a proposal."""
+        return self.decoded_fields_by_quote.get(quote_id, [])
+
+    def best_field(
+        self,
+        quote_id: Optional[str],
+        query_words: frozenset[str],
+        decoded: bool = False
+    ) -> Optional[tuple[int, str, Any]]:
+        """
+        Field of a proposal whose name shares the most words with a query.
+
+        Args:
+            quote_id: Proposal to search.
+            query_words: Significant query words (see query_tokens()).
+            decoded: Score the decoded fields instead of the raw fields.
+
+        Returns:
+            (score, field_name, value) of the first highest-scoring field,
+            or None if no field name shares a word with the query.
+        """
+        fields = self.decoded_fields_for(quote_id) if decoded else self.fields_for(quote_id)
+        csr = (self._decoded_token_csr if decoded else self._field_token_csr).get(quote_id)
+        query_ids = [self.token_vocab[word] for word in query_words if word in self.token_vocab]
+        if csr is None or not query_ids:
+            return None
+
+        token_ids, token_field = csr
+        hits = token_field[np.isin(token_ids, query_ids)]
+        if hits.size == 0:
+            return None
+        scores = np.bincount(hits, minlength=len(fields))
+        best = int(scores.argmax())
+        field_name, value, _ = fields[best]
+        return int(scores[best]), field_name, value
+
+    @functools.cached_property
+    def _search_text(self) -> tuple[str, list[int]]:
+        """
+        Every chunk's searchable text as one lowercase string, plus the
+        offset each chunk starts at (and a final end offset).
+
+        A chunk contributes its text, its field values (decoded values
+        replacing raw ones), risk_location and user_name, each followed by
+        SEARCH_TEXT_SEPARATOR so no match spans two values.
+        """
+        parts = []
+        starts = []
+        offset = 0
+        for chunk in self.metadata:
+            values = [chunk.get("text", "")]
+            raw_fields = chunk.get("fields", {})
+            fields = dict(raw_fields) if isinstance(raw_fields, dict) else {}
+            fields.update(chunk.get("decoded_fields") or {})
+            values.extend(fields.values())
+            values.extend(chunk.get(key) for key in ("risk_location", "user_name") if chunk.get(key))
+            part = "".join(str(value).lower() + SEARCH_TEXT_SEPARATOR for value in values)
+            starts.append(offset)
+            parts.append(part)
+            offset += len(part)
+        starts.append(offset)
+        return "".join(parts), starts
+
+    def chunks_containing(self, needle: str) -> list[int]:
+        """
+        Metadata positions (ascending) of the chunks whose text, field values
+        or location/user name contain a lowercase substring.
+
+        One str.find over the search-text column per matching chunk, instead
+        of a Python loop over every chunk's values.
+        """
+        text, starts = self._search_text
+        positions = []
+        pos = text.find(needle) if needle else -1
+        while pos >= 0:
+            chunk = bisect.bisect_right(starts, pos) - 1
+            positions.append(chunk)
+            # Resume at the next chunk: one hit per chunk is enough
+            pos = text.find(needle, starts[chunk + 1])
+        return positions
+
+    def __len__(self) -> int:
+        return len(self.metadata)
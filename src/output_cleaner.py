@@ -5,9 +5,47 @@ This module implements Pattern 6: Output Sanitization.
 Strips HTML, markdown, and formatting artifacts from every LLM response.
 """
 
+import functools
 import re
 
 
+# (pattern, replacement) pairs applied in order by clean_output
+_CLEANUP_RULES = (
+    # Remove HTML tags
+    (re.compile(r"<[^>]*>"), ""),
+    # Remove HTML entities
+    (re.compile(r"&[a-zA-Z0-9#]+;"), " "),
+    # Remove markdown bold (**text** or __text__)
+    (re.compile(r"\*\*([^*]+)\*\*"), r"\1"),
+    (re.compile(r"__([^_]+)__"), r"\1"),
+    # Remove markdown italic (*text* or _text_)
+    # Be careful not to remove underscores in field names
+    (re.compile(r"(?<!\w)\*([^*]+)\*(?!\w)"), r"\1"),
+    # Remove backticks (inline code)
+    (re.compile(r"`([^`]*)`"), r"\1"),
+    # Remove markdown code blocks
+    (re.compile(r"```[^`]*```", flags=re.DOTALL), ""),
+    # Remove markdown headers (# ## ### etc.)
+    (re.compile(r"^#{1,6}\s+", flags=re.MULTILINE), ""),
+    # Remove bullet point markers at start of lines
+    (re.compile(r"^\s*[\-\•\*\+]\s+", flags=re.MULTILINE), ""),
+    # Remove numbered list markers at start of lines
+    (re.compile(r"^\s*\d+\.\s+", flags=re.MULTILINE), ""),
+    # Remove markdown links but keep text [text](url) -> text
+    (re.compile(r"\[([^\]]+)\]\([^\)]+\)"), r"\1"),
+    # Remove markdown images ![alt](url)
+    (re.compile(r"!\[([^\]]*)\]\([^\)]+\)"), r"\1"),
+    # Collapse multiple newlines to max 2
+    (re.compile(r"\n{3,}"), "\n\n"),
+    # Collapse multiple spaces to single space
+    (re.compile(r" {2,}"), " "),
+)
+
+# Distinct texts whose cleaned form is kept: predefined answers, refusals
+# and scope messages repeat verbatim across queries
+CLEAN_CACHE_SIZE = 1024
+
+
 def clean_output(text: str) -> str:
     """
     Clean and sanitize LLM output by removing formatting artifacts.
@@ -31,53 +69,32 @@ def clean_output(text: str) -> str:
     if not text or not isinstance(text, str):
         return text or ""
 
-    result = text
-
-    # Remove HTML tags
-    result = re.sub(r"<[^>]*>", "", result)
-
-    # Remove HTML entities
-    result = re.sub(r"&[a-zA-Z0-9#]+;", " ", result)
-
-    # Remove markdown bold (**text** or __text__)
-    result = re.sub(r"\*\*([^*]+)\*\*", r"\1", result)
-    result = re.sub(r"__([^_]+)__", r"\1", result)
-
-    # Remove markdown italic (*text* or _text_)
-    # Be careful not to remove underscores in field names
-    result = re.sub(r"(?<!\w)\*([^*]+)\*(?!\w)", r"\1", result)
-
-    # Remove backticks (inline code)
-    result = re.sub(r"`([^`]*)`", r"\1", result)
-
-    # Remove markdown code blocks
-    result = re.sub(r"```[^`]*```", "", result, flags=re.DOTALL)
-
-    # Remove markdown headers (# ## ### etc.)
-    result = re.sub(r"^#{1,6}\s+", "", result, flags=re.MULTILINE)
+    return _clean_text(text)
 
-    # Remove bullet point markers at start of lines
-    result = re.sub(r"^\s*[\-\•\*\+]\s+", "", result, flags=re.MULTILINE)
-
-    # Remove numbered list markers at start of lines
-    result = re.sub(r"^\s*\d+\.\s+", "", result, flags=re.MULTILINE)
 
-    # Remove markdown links but keep text [text](url) -> text
-    result = re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", result)
+def clean_fragment(text: str) -> str:
+    """
+    clean_output() without the cache, for pieces of a streamed answer:
+    they never repeat, so caching them would only evict whole answers.
+    """
+    if not text or not isinstance(text, str):
+        return text or ""
 
-    # Remove markdown images ![alt](url)
-    result = re.sub(r"!\[([^\]]*)\]\([^\)]+\)", r"\1", result)
+    return _apply_cleanup_rules(text)
 
-    # Collapse multiple newlines to max 2
-    result = re.sub(r"\n{3,}", "\n\n", result)
 
-    # Collapse multiple spaces to single space
-    result = re.sub(r" {2,}", " ", result)
+def _apply_cleanup_rules(text: str) -> str:
+    """Apply _CLEANUP_RULES to a non-empty string."""
+    result = text
+    for pattern, replacement in _CLEANUP_RULES:
+        result = pattern.sub(replacement, result)
 
     # Remove leading/trailing whitespace
-    result = result.strip()
+    return result.strip()
 
-    return result
+
+# clean_output's cache over _apply_cleanup_rules
+_clean_text = functools.lru_cache(maxsize=CLEAN_CACHE_SIZE)(_apply_cleanup_rules)
 
 
 def normalize_whitespace(text: str) -> str:
@@ -8,8 +8,8 @@ This module implements Pattern 2 from the Node.js reference:
 """
 from __future__ import annotations
 
-import json
 import numpy as np
+import orjson
 from typing import Optional
 from pathlib import Path
 
@@ -27,6 +27,13 @@ class PredefinedQAStore:
         self.qa_pairs: list[dict] = []
         self.question_embeddings: np.ndarray = None
         self.is_loaded: bool = False
+        self._answer_by_question: dict[str, str] = {}
+
+    def _index_questions(self) -> None:
+        """Map each whitespace-normalized question to its (first) answer."""
+        self._answer_by_question = {}
+        for qa in self.qa_pairs:
+            self._answer_by_question.setdefault(" ".join(qa["question"].split()), qa["answer"])
 
     def load(self, qa_pairs: list[dict]) -> None:
         """
@@ -37,6 +44,7 @@ class PredefinedQAStore:
         """
         self.qa_pairs = qa_pairs
         self.is_loaded = len(qa_pairs) > 0
+        self._index_questions()
 
     def load_from_file(self, filepath: str = PREDEFINED_QA_PATH) -> None:
         """
@@ -51,8 +59,8 @@ class PredefinedQAStore:
             self.is_loaded = False
             return
 
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
 
         if isinstance(data, list):
             self.qa_pairs = data
@@ -60,21 +68,50 @@ class PredefinedQAStore:
             self.qa_pairs = data.get("qa_pairs", [])
 
         self.is_loaded = len(self.qa_pairs) > 0
+        self._index_questions()
 
-    def embed_all(self, embedder) -> None:
+    def embed_all(self, embedder, cache=None) -> None:
         """
         Generate embeddings for all predefined questions.
 
         Args:
             embedder: Embedder instance with embed_texts method.
+            cache: Optional EmbeddingCache; questions embedded by an earlier
+                run are read from it instead of going through the model.
         """
         if not self.qa_pairs:
             self.question_embeddings = np.array([])
             return
 
+        # The question set is small: every uncached question goes through
+        # the model in a single forward pass
+        def embed_batch(texts: list[str]) -> np.ndarray:
+            return embedder.embed_texts(texts, show_progress=False, batch_size=len(texts))
+
         questions = [qa["question"] for qa in self.qa_pairs]
-        embeddings = embedder.embed_texts(questions)
-        self.question_embeddings = np.array(embeddings)
+        if cache is not None:
+            embeddings = cache.embed(questions, embed_batch)
+        else:
+            embeddings = embed_batch(questions)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            self.question_embeddings = np.array([])
+            return
+
+        # Unit rows in one contiguous (Q, d) matrix: matching is a single GEMV
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.question_embeddings = np.ascontiguousarray(embeddings / norms)
+
+    def find_exact(self, query: str) -> Optional[str]:
+        """
+        Return the answer of a predefined question identical to the query
+        (ignoring whitespace), or None. Needs no embedding: an identical
+        question always matches with similarity 1.
+        """
+        if not self.is_loaded:
+            return None
+        return self._answer_by_question.get(" ".join(query.split()))
 
     def find_match(
         self, query_embedding: np.ndarray, threshold: float = 0.85
@@ -95,44 +132,24 @@ class PredefinedQAStore:
         if len(self.question_embeddings) == 0:
             return None
 
-        query_vec = np.array(query_embedding).flatten()
+        query_vec = np.asarray(query_embedding, dtype=np.float32).ravel()
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm == 0:
+            return None
 
-        similarities = []
-        for emb in self.question_embeddings:
-            sim = self._cosine_similarity(query_vec, emb)
-            similarities.append(sim)
+        # Dot product against every predefined (unit) question at once;
+        # only the best score is divided by the query norm, so the query is
+        # never copied into a normalized vector
+        dots = self.question_embeddings @ query_vec
 
-        max_idx = np.argmax(similarities)
-        max_sim = similarities[max_idx]
+        max_idx = int(dots.argmax())
+        max_sim = dots[max_idx] / query_norm
 
         if max_sim >= threshold:
             return self.qa_pairs[max_idx]["answer"]
 
         return None
 
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """
-        Compute cosine similarity between two vectors.
-
-        Args:
-            vec1: First vector.
-            vec2: Second vector.
-
-        Returns:
-            Cosine similarity score between -1 and 1.
-        """
-        vec1 = vec1.flatten()
-        vec2 = vec2.flatten()
-
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-
-        return float(dot_product / (norm1 * norm2))
-
     def get_all_questions(self) -> list[str]:
         """Get all predefined questions."""
         return [qa["question"] for qa in self.qa_pairs]
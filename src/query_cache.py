@@ -0,0 +1,156 @@
+"""
+Query Cache for repeated and near-duplicate questions.
+
+Two lookup levels sit in front of the expensive embed + search path:
+- Exact: the normalized query string (lowercased, whitespace collapsed)
+- Semantic: cosine similarity of the query embedding against the embeddings
+  of recently cached queries, computed as one matrix-vector product
+
+Entries are stored in a fixed-size ring buffer, so memory is bounded by
+maxsize * embedding_dim floats and the oldest entry is evicted first.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+# Configuration constants
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_SIMILARITY_THRESHOLD = 0.97
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for exact-match caching."""
+    return " ".join(query.lower().split())
+
+
+class QueryCache:
+    """
+    Bounded exact + semantic cache keyed by query text and query embedding.
+
+    The semantic level assumes L2-normalized embeddings (as produced by
+    Embedder), so cosine similarity is a plain dot product.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_CACHE_SIZE,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD
+    ):
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize: Maximum number of cached entries.
+            similarity_threshold: Minimum cosine similarity for a semantic hit.
+        """
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (maxsize, dim), allocated on first put
+        self._keys: list[Optional[Hashable]] = [None] * maxsize
+        self._scopes: list[Optional[Hashable]] = [None] * maxsize
+        self._values: list[Any] = [None] * maxsize
+        self._slot_by_key: dict[Hashable, int] = {}
+        self._next_slot = 0
+        self._size = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value cached under an exact key, or None."""
+        with self._lock:
+            slot = self._slot_by_key.get(key)
+            return None if slot is None else self._values[slot]
+
+    def get_similar(
+        self,
+        query_vector: np.ndarray,
+        scope: Optional[Hashable] = None,
+        threshold: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        Return the value of the most similar cached query, or None.
+
+        Args:
+            query_vector: L2-normalized query embedding.
+            scope: Only entries stored with the same scope can match
+                (e.g. the quote ID the query is about).
+            threshold: Override for the similarity threshold.
+
+        Returns:
+            The cached value if a same-scope entry is similar enough, else None.
+        """
+        threshold = self.similarity_threshold if threshold is None else threshold
+
+        with self._lock:
+            if self._size == 0 or self._vectors is None:
+                return None
+
+            vec = np.asarray(query_vector, dtype=np.float32).ravel()
+            sims = self._vectors[:self._size] @ vec
+
+            # Only entries above the threshold are ranked (usually none or
+            # one), instead of sorting every cached similarity
+            candidates = np.flatnonzero(sims >= threshold)
+            for slot in candidates[np.argsort(sims[candidates])[::-1]]:
+                if self._scopes[slot] == scope:
+                    return self._values[slot]
+
+        return None
+
+    def put(
+        self,
+        key: Hashable,
+        query_vector: Optional[np.ndarray],
+        value: Any,
+        scope: Optional[Hashable] = None
+    ) -> None:
+        """
+        Cache a value under an exact key and (optionally) its query embedding.
+
+        Args:
+            key: Exact-match key, usually built from normalize_query().
+            query_vector: L2-normalized query embedding, or None to cache
+                for exact matches only.
+            value: The value to cache.
+            scope: Scope the semantic match is restricted to.
+        """
+        with self._lock:
+            slot = self._slot_by_key.get(key)
+            if slot is None:
+                slot = self._next_slot
+                self._next_slot = (self._next_slot + 1) % self.maxsize
+                self._size = min(self._size + 1, self.maxsize)
+
+                evicted = self._keys[slot]
+                if evicted is not None:
+                    del self._slot_by_key[evicted]
+                self._keys[slot] = key
+                self._slot_by_key[key] = slot
+
+            if query_vector is not None:
+                vec = np.asarray(query_vector, dtype=np.float32).ravel()
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.maxsize, vec.shape[0]), dtype=np.float32)
+                self._vectors[slot] = vec
+            elif self._vectors is not None:
+                # Zero vector never reaches the similarity threshold
+                self._vectors[slot] = 0.0
+
+            self._scopes[slot] = scope
+            self._values[slot] = value
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self._vectors = None
+            self._keys = [None] * self.maxsize
+            self._scopes = [None] * self.maxsize
+            self._values = [None] * self.maxsize
+            self._slot_by_key.clear()
+            self._next_slot = 0
+            self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
@@ -65,15 +65,17 @@ STRUCTURED_FIELD_SIGNALS = [
 
 # Quote ID pattern for structured queries
 QUOTE_ID_PATTERN = re.compile(r"MYJADEQT\d+", re.IGNORECASE)
+QUOTE_ID_PREFIX = "MYJADEQT"
 
 QueryType = Literal["predefined", "analytical", "structured", "semantic"]
 
-def classify_query(query: str) -> QueryType:
+def classify_query(query: str, quote_id: Optional[str] = None) -> QueryType:
     """
     Classify a query into one of four types based on linguistic patterns.
 
     Args:
         query: The user's question string.
+        quote_id: Quote ID already extracted by the caller, if any.
 
     Returns:
         One of: "analytical", "structured", "semantic"
@@ -98,8 +100,7 @@ def classify_query(query: str) -> QueryType:
             return "analytical"
 
     # Check for structured query (quote ID + field question)
-    quote_id_match = QUOTE_ID_PATTERN.search(query)
-    if quote_id_match:
+    if quote_id or extract_quote_id(query):
         # Has quote ID - check if asking about a specific field
         for signal in STRUCTURED_FIELD_SIGNALS:
             if signal in query_lower:
@@ -120,9 +121,29 @@ def extract_quote_id(query: str) -> Optional[str]:
     Returns:
         The quote ID (e.g., "MYJADEQT001") or None if not found.
     """
+    # Cheap substring reject before running the regex; quote IDs are nearly
+    # always typed in upper case, so only upper-case the query if that misses
+    if QUOTE_ID_PREFIX not in query and QUOTE_ID_PREFIX not in query.upper():
+        return None
     match = QUOTE_ID_PATTERN.search(query)
     return match.group(0).upper() if match else None
 
+# Stop words and question words dropped by extract_field_keywords
+_STOP_WORDS = frozenset({
+    "the", "a", "an", "is", "are", "was", "were", "be", "been", "being",
+    "have", "has", "had", "do", "does", "did", "will", "would", "could",
+    "should", "may", "might", "must", "shall", "can", "of", "for", "to",
+    "in", "on", "at", "by", "from", "with", "about", "into", "through",
+    "during", "before", "after", "above", "below", "between", "under",
+    "again", "further", "then", "once", "what", "which", "who", "whom",
+    "this", "that", "these", "those", "am", "and", "but", "if", "or",
+    "because", "as", "until", "while", "how", "many", "much", "where",
+    "when", "why", "all", "each", "every", "both", "few", "more", "most",
+    "other", "some", "such", "no", "not", "only", "own", "same", "so",
+    "than", "too", "very", "just", "also", "now", "here", "there", "any",
+    "tell", "me", "give", "show", "get", "find", "please", "thanks",
+})
+
 def extract_field_keywords(query: str) -> List[str]:
     """
     Extract potential field keywords from a query.
@@ -133,27 +154,12 @@ def extract_field_keywords(query: str) -> List[str]:
     Returns:
         List of lowercase keywords that might match field names.
     """
-    # Remove common stop words and question words
-    stop_words = {
-        "the", "a", "an", "is", "are", "was", "were", "be", "been", "being",
-        "have", "has", "had", "do", "does", "did", "will", "would", "could",
-        "should", "may", "might", "must", "shall", "can", "of", "for", "to",
-        "in", "on", "at", "by", "from", "with", "about", "into", "through",
-        "during", "before", "after", "above", "below", "between", "under",
-        "again", "further", "then", "once", "what", "which", "who", "whom",
-        "this", "that", "these", "those", "am", "and", "but", "if", "or",
-        "because", "as", "until", "while", "how", "many", "much", "where",
-        "when", "why", "all", "each", "every", "both", "few", "more", "most",
-        "other", "some", "such", "no", "not", "only", "own", "same", "so",
-        "than", "too", "very", "just", "also", "now", "here", "there", "any",
-        "tell", "me", "give", "show", "get", "find", "please", "thanks",
-    }
 
     # Extract words
     words = re.findall(r"[a-zA-Z]+", query.lower())
 
     # Filter out stop words and short words
-    keywords = [w for w in words if w not in stop_words and len(w) > 2]
+    keywords = [w for w in words if w not in _STOP_WORDS and len(w) > 2]
 
     return keywords
 
@@ -187,13 +193,14 @@ def is_listing_query(query: str) -> bool:
 
 # Scope-aware query classification
 # QueryClassifier  — pure keyword engine, < 5 ms, no LLM
-# PartialAnswerEngine — data-driven handlers, reads from metadata pickle
+# PartialAnswerEngine — data-driven handlers, reads from the metadata file
 # QueryClassification — dataclass returned by QueryClassifier.classify()
 import os
-import pickle
 from dataclasses import dataclass
 from collections import defaultdict
 
+from src.metadata_index import load_metadata
+
 @dataclass
 class QueryClassification:
     """Result of classifying a query for scope and answerability."""
@@ -424,6 +431,9 @@ class QueryClassifier:
         ),
     }
 
+    # Domains that always make a query OUT_OF_SCOPE (see classify, Rule A)
+    _ALWAYS_OOS_DOMAINS = frozenset({"foreign_countries", "temporal"})
+
     # Public API
     def classify(self, query: str) -> QueryClassification:
         """
@@ -473,8 +483,7 @@ class QueryClassifier:
         #   • temporal           — time-based comparisons (yoy, trends, etc.)
         #                          We have no historical data for these; showing
         #                          a current ranking would be misleading.
-        _always_oos = {"foreign_countries", "temporal"}
-        if _always_oos & set(triggered_domains):
+        if self._ALWAYS_OOS_DOMAINS.intersection(triggered_domains):
             return QueryClassification(
                 classification="OUT_OF_SCOPE",
                 out_of_scope_reason=self._explain_scope(triggered_domains, q),
@@ -801,17 +810,23 @@ class PartialAnswerEngine:
     hardcoded (no business names, quote IDs, or values).
     """
 
-    def __init__(self, metadata_path: str = "index/metadata.pkl") -> None:
+    def __init__(
+        self,
+        metadata_path: str = "index/metadata.json",
+        metadata: Optional[List[dict]] = None
+    ) -> None:
         self._path = metadata_path
-        self._metadata: Optional[List[dict]] = None
+        # Already-loaded metadata (e.g. the list served with the FAISS index)
+        # is used as-is; otherwise the file is read on first access
+        self._metadata: Optional[List[dict]] = metadata
+        self._name_map: Optional[dict] = None
 
     # Lazy metadata access
     @property
     def metadata(self) -> List[dict]:
         if self._metadata is None:
             if os.path.exists(self._path):
-                with open(self._path, "rb") as f:
-                    self._metadata = pickle.load(f)
+                self._metadata = load_metadata(self._path)
             else:
                 self._metadata = []
         return self._metadata
@@ -823,7 +838,7 @@ class PartialAnswerEngine:
         Scan all business_profile section chunks and return a mapping of
         quote_id → human-readable business name.
 
-        Must be called at the start of every partial-answer handler so that
+        Handlers use the per-engine copy from _business_name_map() so that
         the correct business name is shown regardless of which section chunk
         is currently being iterated.
         """
@@ -849,6 +864,18 @@ class PartialAnswerEngine:
                 name_map[qid] = qid
         return name_map
 
+    def _business_name_map(self) -> dict:
+        """
+        quote_id → business name over the complete proposals, built on first
+        use and reused by every handler (the metadata does not change for
+        the lifetime of this engine).
+        """
+        if self._name_map is None:
+            self._name_map = self._build_business_name_map(
+                self._get_complete_proposals_only(self.metadata)
+            )
+        return self._name_map
+
     # Shared helper: filter for complete submissions only
     def _get_complete_proposals_only(self, metadata: list) -> list:
         """
@@ -963,7 +990,7 @@ class PartialAnswerEngine:
     def handle_rank_by_sum_assured(self, top_n: int = 15) -> str:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
 
         ranked = []
@@ -1040,7 +1067,7 @@ class PartialAnswerEngine:
 
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
 
         results = []
@@ -1191,14 +1218,14 @@ class PartialAnswerEngine:
         "strong_room":        "Strong Room",
     }
 
-    _YES_VALUES = {"yes", "001", "true", "1"}
+    _YES_VALUES = frozenset({"yes", "001", "true", "1"})
 
     def handle_security_feature_summary(self) -> str:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
         # Bug 1 fix: build name map from business_profile chunks
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
 
         # Build security feature map: quote_id → {section: bool}
         security_map: dict = defaultdict(dict)
@@ -1251,7 +1278,7 @@ class PartialAnswerEngine:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
         total = len(name_map)
 
         # Build type → list of business names
@@ -1301,7 +1328,7 @@ class PartialAnswerEngine:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
 
         # Step 1: Build location map from any chunk (risk_location is on all)
         location_map: dict = {}  # quote_id → state
@@ -1429,7 +1456,7 @@ class PartialAnswerEngine:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
 
         has_claims: list = []
         no_claims: list = []
@@ -1503,7 +1530,7 @@ class PartialAnswerEngine:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
 
         # Build location map
         location_map: dict = {}
@@ -1554,7 +1581,7 @@ class PartialAnswerEngine:
         metadata = self.metadata
         complete_metadata = self._get_complete_proposals_only(metadata)
         incomplete_qids = self._get_incomplete_quote_ids(metadata)
-        name_map = self._build_business_name_map(complete_metadata)
+        name_map = self._business_name_map()
 
         # Build location map for display
         loc_map: dict = {}
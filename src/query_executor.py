@@ -17,13 +17,14 @@ decode_field() in this module — doing so would double-decode and fail.
 """
 from __future__ import annotations
 
+import functools
 import os
-import pickle
 import re
 from typing import Optional
 from dataclasses import dataclass
 
 from src.query_parser import ParsedQuery
+from src.metadata_index import MetadataIndex, load_metadata
 
 # ---- Section keyword mapping for field-match disambiguation ----
 SECTION_KEYWORDS = {
@@ -58,6 +59,48 @@ SECTION_KEYWORDS = {
     "fidelity": ["add_on_coverage"],
 }
 
+# Normalized filter values meaning "No" / "Yes"
+NO_CODES = frozenset({"no", "002", "false", "2"})
+YES_CODES = frozenset({"yes", "001", "true", "1"})
+
+# Words dropped from a raw query before it is used as free-text search terms
+SEARCH_IGNORE_WORDS = frozenset({
+    "what", "how", "many", "which", "the", "are", "have", "has", "with", "and",
+    "for", "their", "names", "all"
+})
+
+# Words ignored when comparing requested and actual field names
+FIELD_NOISE_WORDS = frozenset({"the", "a", "an", "of", "in", "for", "is", "do", "you", "label"})
+
+
+@functools.lru_cache(maxsize=None)
+def _field_key(field_name: str) -> tuple[str, frozenset[str]]:
+    """Normalized field name ("_label" and underscores stripped) and its significant words."""
+    normalized = field_name.lower().replace("_label", "").replace("_", " ")
+    return normalized, frozenset(normalized.split()) - FIELD_NOISE_WORDS
+
+
+@functools.lru_cache(maxsize=None)
+def _field_lower(field_name: str) -> str:
+    """Lowercase field name, cached since field names repeat across every chunk."""
+    return field_name.lower()
+
+
+@functools.lru_cache(maxsize=None)
+def _filter_key(field_name: str) -> str:
+    """Lowercase field name with "_label" stripped, as compared by filter queries."""
+    return field_name.lower().replace("_label", "")
+
+
+@functools.lru_cache(maxsize=1024)
+def _preferred_sections(query: str) -> Optional[frozenset[str]]:
+    """Sections the query's keywords point at (None if it names none)."""
+    query_lower = query.lower()
+    relevant_keywords = [k for k in SECTION_KEYWORDS if k in query_lower]
+    if not relevant_keywords:
+        return None
+    return frozenset(section for k in relevant_keywords for section in SECTION_KEYWORDS[k])
+
 @dataclass
 class QueryResult:
     """Result of executing a parsed query."""
@@ -77,22 +120,30 @@ class SmartQueryExecutor:
     double-decode and produce wrong results.
     """
     
-    def __init__(self, metadata_path: str = "index/metadata.pkl"):
+    def __init__(
+        self,
+        metadata_path: str = "index/metadata.json",
+        meta_index: Optional[MetadataIndex] = None
+    ):
         """
         Initialize the executor.
         
         Args:
-            metadata_path: Path to the metadata pickle file
+            metadata_path: Path to the metadata file
+            meta_index: Already-built index over the metadata; when given,
+                the metadata file is not read
         """
         self.metadata_path = metadata_path
+        self.meta_index = meta_index
         self.metadata = []
         self._load_metadata()
     
     def _load_metadata(self) -> None:
-        """Load metadata from pickle file."""
-        if os.path.exists(self.metadata_path):
-            with open(self.metadata_path, "rb") as f:
-                self.metadata = pickle.load(f)
+        """Load metadata from the metadata file (unless an index was supplied)."""
+        if self.meta_index is None:
+            metadata = load_metadata(self.metadata_path) if os.path.exists(self.metadata_path) else []
+            self.meta_index = MetadataIndex(metadata)
+        self.metadata = self.meta_index.metadata
     
     # Empty / null value helper
     def _is_empty_value(self, value) -> bool:
@@ -112,8 +163,8 @@ class SmartQueryExecutor:
         Includes a section-relevance bonus/penalty so that fields from the
         correct section are preferred when multiple fields share a keyword.
         """
-        req = requested_field.lower().replace("_label", "").replace("_", " ")
-        act = actual_field.lower().replace("_label", "").replace("_", " ")
+        req, req_words = _field_key(requested_field)
+        act, act_words = _field_key(actual_field)
         
         # Exact match — perfect
         if req == act:
@@ -124,10 +175,6 @@ class SmartQueryExecutor:
             base = 50 + len(min(req, act, key=len))
         else:
             # Word overlap
-            noise = {"the", "a", "an", "of", "in", "for", "is", "do", "you", "label"}
-            req_words = set(req.split()) - noise
-            act_words = set(act.split()) - noise
-            
             if not req_words:
                 return 0
             
@@ -140,16 +187,9 @@ class SmartQueryExecutor:
         # Section relevance bonus / penalty
         section_bonus = 0
         if chunk_section and query:
-            query_lower = query.lower()
-            relevant_keywords = [k for k in SECTION_KEYWORDS if k in query_lower]
-            if relevant_keywords:
-                all_preferred = set()
-                for k in relevant_keywords:
-                    all_preferred.update(SECTION_KEYWORDS[k])
-                if chunk_section in all_preferred:
-                    section_bonus = 25   # correct section
-                else:
-                    section_bonus = -20  # wrong section
+            preferred = _preferred_sections(query)
+            if preferred is not None:
+                section_bonus = 25 if chunk_section in preferred else -20
         
         return max(0, base + section_bonus)
     
@@ -227,10 +267,7 @@ class SmartQueryExecutor:
         quote_id = parsed.quote_id
         results = []
         
-        for chunk in self.metadata:
-            if chunk.get("quote_id") != quote_id:
-                continue
-            
+        for chunk in self.meta_index.chunks_for(quote_id):
             search_fields = self._get_search_fields(chunk)
             if not search_fields:
                 continue
@@ -356,7 +393,24 @@ class SmartQueryExecutor:
         """
         query_lower = query.lower()
         
-        # Collect all known names — longest first for greedy matching
+        for name, name_lower in self._known_names:
+            if name_lower in query_lower:
+                return name
+        
+        return None
+    
+    @staticmethod
+    def _is_name_field(field_name: str) -> bool:
+        """True for business_name / person_in_charge fields."""
+        field_lower = _field_lower(field_name)
+        return "business_name" in field_lower or "person_in_charge" in field_lower
+    
+    @functools.cached_property
+    def _known_names(self) -> list[tuple[str, str]]:
+        """
+        (name, lowercase name) of every known person and business, longest
+        first so the greediest match wins. Built once per executor.
+        """
         known_names = set()
         for chunk in self.metadata:
             # Top-level user_name (person)
@@ -365,21 +419,34 @@ class SmartQueryExecutor:
                 known_names.add(str(uname).strip())
             
             # Use decoded_fields for business_name / person_in_charge
-            search_fields = self._get_search_fields(chunk)
-            for field_name, value in search_fields.items():
-                if "business_name" in field_name.lower() or "person_in_charge" in field_name.lower():
+            for field_name, value in self._get_search_fields(chunk).items():
+                if self._is_name_field(field_name):
                     val = str(value).strip()
                     if val and val.lower() not in ("unknown", "none", ""):
                         known_names.add(val)
         
         # Sort by length descending (match longest names first to avoid partial matches)
-        sorted_names = sorted(known_names, key=len, reverse=True)
-        
-        for name in sorted_names:
-            if name.lower() in query_lower:
-                return name
-        
-        return None
+        return [(name, name.lower()) for name in sorted(known_names, key=len, reverse=True)]
+    
+    @functools.cached_property
+    def _entity_rows(self) -> list[tuple[dict, str, str, list[str]]]:
+        """
+        (chunk, quote_id, lowercase user_name, lowercase name-field values)
+        per chunk, lowered once instead of on every entity lookup.
+        """
+        return [
+            (
+                chunk,
+                chunk.get("quote_id"),
+                str(chunk.get("user_name", "")).lower().strip(),
+                [
+                    str(value).lower().strip()
+                    for field_name, value in self._get_search_fields(chunk).items()
+                    if self._is_name_field(field_name)
+                ],
+            )
+            for chunk in self.metadata
+        ]
     
     # Entity lookup (by person/business name)
     def _execute_entity_lookup(self, parsed: ParsedQuery) -> QueryResult:
@@ -417,27 +484,17 @@ class SmartQueryExecutor:
         matched_quotes = {}  # quote_id -> business_name
         seen_quotes = set()
         
-        for chunk in self.metadata:
-            quote_id = chunk.get("quote_id")
+        for chunk, quote_id, user_name, name_values in self._entity_rows:
             if not quote_id or quote_id in seen_quotes:
                 continue
             
-            search_fields = self._get_search_fields(chunk)
-            found = False
-            
-            # Check top-level user_name
-            user_name = str(chunk.get("user_name", "")).lower().strip()
-            if search_name in user_name or user_name in search_name:
-                found = True
-            
-            # Check person_in_charge / business_name in search_fields
+            # Check top-level user_name, then person_in_charge / business_name
+            found = search_name in user_name or user_name in search_name
             if not found:
-                for field_name, value in search_fields.items():
-                    if "person_in_charge" in field_name.lower() or "business_name" in field_name.lower():
-                        val_lower = str(value).lower().strip()
-                        if search_name in val_lower or val_lower in search_name:
-                            found = True
-                            break
+                found = any(
+                    search_name in val_lower or val_lower in search_name
+                    for val_lower in name_values
+                )
             
             if found:
                 seen_quotes.add(quote_id)
@@ -459,10 +516,7 @@ class SmartQueryExecutor:
         for match_qid, match_bname in matched_quotes.items():
             retrieved_fields = {}
             
-            for chunk in self.metadata:
-                if chunk.get("quote_id") != match_qid:
-                    continue
-                
+            for chunk in self.meta_index.chunks_for(match_qid):
                 search_fields = self._get_search_fields(chunk)
                 
                 for out_field in output_fields:
@@ -534,68 +588,48 @@ class SmartQueryExecutor:
         matching_quotes = set()
         matching_data = []
         
-        for chunk in self.metadata:
-            quote_id = chunk.get("quote_id")
-            if not quote_id or quote_id in matching_quotes:
-                continue
+        # Check filter_contains - search in decoded fields, chunk text, AND top-level metadata.
+        # The index's search-text column yields just the chunks containing the term.
+        if parsed.filter_contains:
+            search_term = parsed.filter_contains.lower()
+            for position in self.meta_index.chunks_containing(search_term):
+                chunk = self.metadata[position]
+                quote_id = chunk.get("quote_id")
+                if not quote_id or quote_id in matching_quotes:
+                    continue
+                
+                matching_quotes.add(quote_id)
+                business_name = self._get_field_value(chunk, "business_name")
+                matching_data.append({
+                    "quote_id": quote_id,
+                    "business_name": business_name,
+                    "section": chunk.get("section", ""),
+                    "matched_text": chunk.get("text", "").lower()[:100]
+                })
+        
+        # Check for filter on fields (yes/no decoded values, exact match, or substring)
+        elif parsed.filter_field and parsed.filter_value:
+            expected = str(parsed.filter_value).lower().strip()
+            filter_key = _filter_key(parsed.filter_field)
             
-            search_fields = self._get_search_fields(chunk)
-            chunk_text = chunk.get("text", "").lower()
-            section = chunk.get("section", "")
+            # Determine whether this is a negation query (filter_value
+            # represents "No" / absence).  Negation queries should also
+            # match proposals where the field is empty/missing.
+            is_negation = expected in NO_CODES
             
-            # Check filter_contains - search in decoded fields, chunk text, AND top-level metadata
-            if parsed.filter_contains:
-                search_term = parsed.filter_contains.lower()
-                found = False
-                
-                # Check chunk text
-                if search_term in chunk_text:
-                    found = True
-                
-                # Check in decoded field values
-                if not found:
-                    for field_name, value in search_fields.items():
-                        if search_term in str(value).lower():
-                            found = True
-                            break
-                
-                # Check top-level metadata keys
-                if not found:
-                    for top_key in ("risk_location", "user_name"):
-                        top_val = chunk.get(top_key, "")
-                        if top_val and search_term in str(top_val).lower():
-                            found = True
-                            break
+            for chunk in self.metadata:
+                quote_id = chunk.get("quote_id")
+                if not quote_id or quote_id in matching_quotes:
+                    continue
                 
-                if found:
-                    matching_quotes.add(quote_id)
-                    business_name = self._get_field_value(chunk, "business_name")
-                    matching_data.append({
-                        "quote_id": quote_id,
-                        "business_name": business_name,
-                        "section": section,
-                        "matched_text": chunk_text[:100]
-                    })
-                continue
-            
-            # Check for filter on fields (yes/no decoded values, exact match, or substring)
-            if parsed.filter_field and parsed.filter_value:
-                expected = str(parsed.filter_value).lower().strip()
-                filter_key = parsed.filter_field.lower().replace("_label", "")
+                search_fields = self._get_search_fields(chunk)
                 matched = False
                 matched_field = None
                 matched_value = None
                 
-                # Determine whether this is a negation query (filter_value
-                # represents "No" / absence).  Negation queries should also
-                # match proposals where the field is empty/missing.
-                NO_CODES = {"no", "002", "false", "2"}
-                YES_CODES = {"yes", "001", "true", "1"}
-                is_negation = expected in NO_CODES
-                
                 # Search in decoded fields
                 for field_name, value in search_fields.items():
-                    if filter_key in field_name.lower().replace("_label", ""):
+                    if filter_key in _filter_key(field_name):
                         # Guard: skip empty/null field values.
                         #
                         # For POSITIVE filters (e.g. armed_guards = Yes):
@@ -761,8 +795,7 @@ class SmartQueryExecutor:
             search_terms.append(parsed.filter_contains.lower())
         
         query_words = re.findall(r'\b[a-zA-Z]{3,}\b', parsed.raw_query.lower())
-        ignore_words = {"what", "how", "many", "which", "the", "are", "have", "has", "with", "and", "for", "their", "names", "all"}
-        search_terms.extend([w for w in query_words if w not in ignore_words])
+        search_terms.extend([w for w in query_words if w not in SEARCH_IGNORE_WORDS])
         
         for chunk in self.metadata:
             quote_id = chunk.get("quote_id")
@@ -775,7 +808,7 @@ class SmartQueryExecutor:
             
             for field_name, value in search_fields.items():
                 value_str = str(value).lower()
-                field_lower = field_name.lower()
+                field_lower = _field_lower(field_name)
                 
                 for term in search_terms:
                     if term in value_str or term in field_lower:
@@ -814,18 +847,19 @@ class SmartQueryExecutor:
     def _get_field_value(self, chunk: dict, field_pattern: str) -> str:
         """Get a decoded field value from a chunk by pattern matching."""
         # Check decoded_fields first (already human-readable)
+        pattern_lower = field_pattern.lower()
         search_fields = self._get_search_fields(chunk)
         for field_name, value in search_fields.items():
-            if field_pattern.lower() in field_name.lower():
+            if pattern_lower in _field_lower(field_name):
                 return str(value)
         
         # Check other chunks for the same quote_id
         quote_id = chunk.get("quote_id")
-        for other_chunk in self.metadata:
-            if other_chunk.get("quote_id") == quote_id and other_chunk != chunk:
+        for other_chunk in self.meta_index.chunks_for(quote_id):
+            if other_chunk != chunk:
                 other_fields = self._get_search_fields(other_chunk)
                 for field_name, value in other_fields.items():
-                    if field_pattern.lower() in field_name.lower():
+                    if pattern_lower in _field_lower(field_name):
                         return str(value)
         
         return "Unknown"
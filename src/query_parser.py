@@ -11,13 +11,16 @@ Architecture:
 """
 from __future__ import annotations
 
-import json
 import re
+import threading
 from typing import Optional
 from dataclasses import dataclass
 
+from loader.json_cleaner import loads_json
 from src.llm_client import LLMClient
 
+QUOTE_ID_PATTERN = re.compile(r'MYJADEQT\d+', re.IGNORECASE)
+
 
                                                           
 AVAILABLE_FIELDS = """
@@ -334,6 +337,10 @@ class QueryParser:
         """
         self.llm = llm
         self.conversation_history: list[dict] = []
+        # API requests run in a threadpool and share one parser
+        self._history_lock = threading.Lock()
+        # (history list, its length, rendered text) behind recent_history_text()
+        self._history_text_cache: tuple[list, int, str] = ([], 0, "")
         
                                                       
         self._known_persons: list[str] = []
@@ -385,6 +392,12 @@ class QueryParser:
                 "Prime Pawn Services", "Sunrise Jewel House", "Harbor FX Services"
             ]
     
+    # Capitalised words that never start a Title Case entity phrase
+    _TITLE_CASE_IGNORE_WORDS = frozenset({
+        "What", "Which", "How", "Does", "Do", "Is", "Are", "Who",
+        "Where", "When", "The", "A", "An", "CCTV", "GPS", "SOP"
+    })
+
     def _extract_entity_from_query(self, query: str) -> Optional[str]:
         """
         Extract the most likely entity (person name or business name)
@@ -417,10 +430,6 @@ class QueryParser:
         # -----------------------------------------------------------
         # Safety net: extract Title Case phrases as candidate entities
         # -----------------------------------------------------------
-        IGNORE_WORDS = {
-            "What", "Which", "How", "Does", "Do", "Is", "Are", "Who",
-            "Where", "When", "The", "A", "An", "CCTV", "GPS", "SOP"
-        }
         
         words = query.split()
         segments: list[list[str]] = []
@@ -429,7 +438,7 @@ class QueryParser:
         for word in words:
             # Strip trailing punctuation for the check but keep original
             stripped = word.rstrip("?.,!;:")
-            if stripped and stripped[0].isupper() and stripped not in IGNORE_WORDS:
+            if stripped and stripped[0].isupper() and stripped not in self._TITLE_CASE_IGNORE_WORDS:
                 current_segment.append(stripped)
             else:
                 if current_segment:
@@ -448,7 +457,7 @@ class QueryParser:
         
         if best is None:
             for seg in segments:
-                if len(seg) == 1 and seg[0] not in IGNORE_WORDS:
+                if len(seg) == 1 and seg[0] not in self._TITLE_CASE_IGNORE_WORDS:
                     best = seg
                     break
         
@@ -485,7 +494,7 @@ class QueryParser:
             parsed: The parsed query result
             answer: The answer that was given
         """
-        self.conversation_history.append({
+        entry = {
             "query": query,
             "intent": parsed.intent,
             "filter_field": parsed.filter_field,
@@ -495,10 +504,8 @@ class QueryParser:
             "output_fields": parsed.output_fields,
             "understood_question": parsed.understood_question,
             "answer_preview": answer[:200]
-        })
-                                
-        if len(self.conversation_history) > 5:
-            self.conversation_history = self.conversation_history[-5:]
+        }
+        self._append_history(entry)
     
     def add_raw_to_history(self, query: str, answer: str) -> None:
         """
@@ -509,7 +516,7 @@ class QueryParser:
             query: The user's original question
             answer: The answer that was given
         """
-        self.conversation_history.append({
+        entry = {
             "query": query,
             "intent": "unknown",
             "filter_field": None,
@@ -519,10 +526,34 @@ class QueryParser:
             "output_fields": [],
             "understood_question": query,
             "answer_preview": answer[:200]
-        })
-                                
-        if len(self.conversation_history) > 5:
-            self.conversation_history = self.conversation_history[-5:]
+        }
+        self._append_history(entry)
+    
+    def _append_history(self, entry: dict) -> None:
+        """Append a turn and keep only the last 5, atomically."""
+        # Rendered once here rather than on every prompt that quotes the turn
+        entry["transcript"] = f"User: {entry['query']}\nAssistant: {entry['answer_preview']}"
+        with self._history_lock:
+            self.conversation_history = (self.conversation_history + [entry])[-5:]
+    
+    def recent_history_text(self, turns: int = 3) -> str:
+        """
+        "Previous conversation:" block quoting the last few turns, for the
+        answer-generation prompt ("" when there is no history).
+        
+        The text is rebuilt only after the history changes.
+        """
+        history = self.conversation_history
+        cached_history, cached_len, text = self._history_text_cache
+        if history is cached_history and len(history) == cached_len:
+            return text
+        
+        text = ""
+        if history:
+            lines = "\n".join(turn["transcript"] for turn in history[-turns:])
+            text = f"Previous conversation:\n{lines}\n\n"
+        self._history_text_cache = (history, len(history), text)
+        return text
     
                                                       
     LOCATION_INDICATORS = [
@@ -532,28 +563,31 @@ class QueryParser:
         "in kota kinabalu", "in george town", "in sungai petani", "in kuantan",
         "location", "located", "based in", "situated in"
     ]
+    _LOCATION_INDICATOR_RE = re.compile("|".join(map(re.escape, LOCATION_INDICATORS)))
 
     def _is_location_query(self, query: str) -> bool:
         """Check if query is about a location/place."""
         query_lower = query.lower()
-        return any(ind in query_lower for ind in self.LOCATION_INDICATORS)
+        return self._LOCATION_INDICATOR_RE.search(query_lower) is not None
+
+    # Words never part of an entity name (context-bleed detection)
+    _ENTITY_NOISE_WORDS = frozenset({
+        "does", "do", "is", "what", "which", "how", "far", "often", "type", "of",
+        "the", "a", "an", "for", "have", "use", "run", "business", "carry", "out",
+        "keep", "detailed", "records", "standard", "operating", "procedure", "in",
+        "place", "armed", "guards", "during", "transit", "background", "checks",
+        "long", "retain", "cctv", "recordings", "safe", "grade", "nearest",
+        "police", "station", "strong", "room", "door", "access", "backup", "and",
+        "with", "their", "them", "that", "this", "from", "are", "has", "had", "its",
+        "stock", "check", "movements", "contract", "maintenance", "used", "using",
+        "get", "give", "tell", "show", "sop", "much", "many", "where", "when",
+        "who", "proposals", "located", "based", "situated", "count", "number",
+    })
 
     def _get_entity_from_query(self, query: str) -> str:
         """Extract likely entity name from query for context bleed detection."""
-        noise = {"does", "do", "is", "what", "which", "how", "far", "often",
-                 "type", "of", "the", "a", "an", "for", "have", "use", "run",
-                 "business", "carry", "out", "keep", "detailed", "records",
-                 "standard", "operating", "procedure", "in", "place", "armed",
-                 "guards", "during", "transit", "background", "checks", "long",
-                 "retain", "cctv", "recordings", "safe", "grade", "nearest",
-                 "police", "station", "strong", "room", "door", "access", "backup",
-                 "and", "with", "their", "them", "that", "this", "from", "are",
-                 "has", "had", "its", "stock", "check", "movements", "contract",
-                 "maintenance", "used", "using", "get", "give", "tell", "show",
-                 "sop", "much", "many", "where", "when", "who",
-                 "proposals", "located", "based", "situated", "count", "number"}
         words = query.lower().split()
-        entity_words = [w.strip("?.,!") for w in words if w.strip("?.,!") not in noise and len(w.strip("?.,!")) > 2]
+        entity_words = [w.strip("?.,!") for w in words if w.strip("?.,!") not in self._ENTITY_NOISE_WORDS and len(w.strip("?.,!")) > 2]
         return " ".join(entity_words[:4])
 
     def _build_history_section(self, current_query: str = "") -> str:
@@ -674,6 +708,41 @@ class QueryParser:
             parse_success=True
         )
     
+    # Feature phrase -> (field name, value meaning "has it", value meaning "lacks it")
+    FEATURE_MAP = {
+        "display window":     ("do_you_have_display_window_label",                  "Yes", "No"),
+        "have display window": ("do_you_have_display_window_label",                 "Yes", "No"),
+        "has display window": ("do_you_have_display_window_label",                  "Yes", "No"),
+        "window display":     ("do_you_have_display_window_label",                  "Yes", "No"),
+        "wall showcase":      ("do_you_have_wall_showcase_label",                   "Yes", "No"),
+        "counter showcase":   ("do_you_have_counter_showcase_label",                "Yes", "No"),
+        "alarm":              ("do_you_have_alarm_label",                           "Yes", "No"),
+        "cctv maintenance":   ("cctv_maintenance_contract_label",                   "Yes", "No"),
+        "cctv recording":     ("recording_label",                                   "Yes", "No"),
+        "strong room":        ("do_you_have_a_strong_room_label",                   "Yes", "No"),
+        "armoured vehicle":   ("do_you_use_armoured_vehicle_label",                 "Yes", "No"),
+        "armed guards":       ("do_you_use_armed_guards_during_transit_label",      "Yes", "No"),
+        "guards at premise":  ("do_you_use_guards_at_premise_label",                "Yes", "No"),
+        "gps tracker":        ("installed_gps_tracker_in_transit_vehicles_label",   "Yes", "No"),
+        "jaguar transit":     ("usage_of_jaguar_transit_label",                     "Yes", "No"),
+        "standard operating procedure": ("standard_operating_procedure_label",      "Yes", "No"),
+        "sop":                ("standard_operating_procedure_label",                "Yes", "No"),
+        "stock records":      ("do_you_keep_detailed_records_of_stock_movements_label", "Yes", "No"),
+        "detailed records":   ("do_you_keep_detailed_records_of_stock_movements_label", "Yes", "No"),
+        "shoplifting":        ("shop_lifting_label",                                "Yes", "No"),
+        "shop lifting":       ("shop_lifting_label",                                "Yes", "No"),
+        "time locking":       ("time_locking_label",                                "Yes", "No"),
+        "central monitoring": ("central_monitoring_stations_label",                 "Yes", "No"),
+        "alarm maintenance":  ("under_maintenance_contract_label",                  "Yes", "No"),
+        "fidelity guarantee": ("fidelity_guarantee_insurance_add_coverage_label",   "Yes", "No"),
+        "director house":     ("director_house_question_label",                     "Yes", "No"),
+        "background check":   ("background_checks_for_all_employees_label",         "Yes", "No"),
+        "claims within":      ("claim_history_label", "Claims within the past 3 years", "No claim within 3 years"),
+        "claim history":      ("claim_history_label", "Claims within the past 3 years", "No claim within 3 years"),
+        "past 3 years":       ("claim_history_label", "Claims within the past 3 years", "No claim within 3 years"),
+        "no claim":           ("claim_history_label", "No claim within 3 years", "Claims within the past 3 years"),
+    }
+
     def _try_deterministic_count(self, query: str) -> Optional[ParsedQuery]:
         """
         Intercept simple 'how many proposals have X' queries deterministically.
@@ -688,39 +757,6 @@ class QueryParser:
                                                                            
                                                          
                                                                   
-        FEATURE_MAP = {
-            "display window":     ("do_you_have_display_window_label",                  "Yes", "No"),
-            "have display window": ("do_you_have_display_window_label",                 "Yes", "No"),
-            "has display window": ("do_you_have_display_window_label",                  "Yes", "No"),
-            "window display":     ("do_you_have_display_window_label",                  "Yes", "No"),
-            "wall showcase":      ("do_you_have_wall_showcase_label",                   "Yes", "No"),
-            "counter showcase":   ("do_you_have_counter_showcase_label",                "Yes", "No"),
-            "alarm":              ("do_you_have_alarm_label",                           "Yes", "No"),
-            "cctv maintenance":   ("cctv_maintenance_contract_label",                   "Yes", "No"),
-            "cctv recording":     ("recording_label",                                   "Yes", "No"),
-            "strong room":        ("do_you_have_a_strong_room_label",                   "Yes", "No"),
-            "armoured vehicle":   ("do_you_use_armoured_vehicle_label",                 "Yes", "No"),
-            "armed guards":       ("do_you_use_armed_guards_during_transit_label",      "Yes", "No"),
-            "guards at premise":  ("do_you_use_guards_at_premise_label",                "Yes", "No"),
-            "gps tracker":        ("installed_gps_tracker_in_transit_vehicles_label",   "Yes", "No"),
-            "jaguar transit":     ("usage_of_jaguar_transit_label",                     "Yes", "No"),
-            "standard operating procedure": ("standard_operating_procedure_label",      "Yes", "No"),
-            "sop":                ("standard_operating_procedure_label",                "Yes", "No"),
-            "stock records":      ("do_you_keep_detailed_records_of_stock_movements_label", "Yes", "No"),
-            "detailed records":   ("do_you_keep_detailed_records_of_stock_movements_label", "Yes", "No"),
-            "shoplifting":        ("shop_lifting_label",                                "Yes", "No"),
-            "shop lifting":       ("shop_lifting_label",                                "Yes", "No"),
-            "time locking":       ("time_locking_label",                                "Yes", "No"),
-            "central monitoring": ("central_monitoring_stations_label",                 "Yes", "No"),
-            "alarm maintenance":  ("under_maintenance_contract_label",                  "Yes", "No"),
-            "fidelity guarantee": ("fidelity_guarantee_insurance_add_coverage_label",   "Yes", "No"),
-            "director house":     ("director_house_question_label",                     "Yes", "No"),
-            "background check":   ("background_checks_for_all_employees_label",         "Yes", "No"),
-            "claims within":      ("claim_history_label", "Claims within the past 3 years", "No claim within 3 years"),
-            "claim history":      ("claim_history_label", "Claims within the past 3 years", "No claim within 3 years"),
-            "past 3 years":       ("claim_history_label", "Claims within the past 3 years", "No claim within 3 years"),
-            "no claim":           ("claim_history_label", "No claim within 3 years", "Claims within the past 3 years"),
-        }
         
                                                                 
         negation = any(w in query_lower for w in [
@@ -733,7 +769,7 @@ class QueryParser:
         matched_yes = None
         matched_no = None
         
-        for phrase, (field_name, yes_val, no_val) in FEATURE_MAP.items():
+        for phrase, (field_name, yes_val, no_val) in self.FEATURE_MAP.items():
             if phrase in query_lower:
                 matched_field = field_name
                 matched_yes = yes_val
@@ -899,7 +935,7 @@ class QueryParser:
             if not json_match:
                 return self._fallback_parse(query)
             
-            parsed = json.loads(json_match.group())
+            parsed = loads_json(json_match.group())
             
                                                              
             raw_intent = parsed.get("intent", "lookup").lower().strip()
@@ -986,7 +1022,7 @@ class QueryParser:
         query_lower = query.lower()
         
                           
-        quote_match = re.search(r'MYJADEQT\d+', query, re.IGNORECASE)
+        quote_match = QUOTE_ID_PATTERN.search(query)
         quote_id = quote_match.group().upper() if quote_match else None
         
                           